@@ -6,7 +6,35 @@
 __pdoc__ = {
     'Proxy.__': True
 }
-from .view import *
-from .excs import *
-from .core import *
-from .util import *
+import importlib
+
+# submodules and what they export are imported the first time they're used
+# (PEP 562) so `import remoteobj` is cheap, e.g. for short-lived spawned workers.
+_SUBMODULES = ('base', 'codec', 'core', 'excs', 'hooks', 'metrics', 'record', 'util', 'view')
+_EXPORTS = {
+    'view': ['View', 'view_shape'],
+    'excs': ['Except', 'LocalExcept', 'RemoteException', 'ListenerOverloaded'],
+    'core': ['get', 'Proxy'],
+    'hooks': ['add_hook', 'remove_hook'],
+    'util': [
+        'process', 'thread', 'job', 'pool', 'pmap', 'join_all', 'as_completed',
+        'listener', 'listeners', 'dummy_listener', 'listener_func', 'wait_until_listening',
+        'raise_thread', 'find_thread', 'segfault', 'set_faulthandler', 'mprint'],
+}
+_LAZY = {name: mod for mod, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    if name in _LAZY:
+        value = getattr(importlib.import_module('.' + _LAZY[name], __name__), name)
+        globals()[name] = value  # so we only do this once
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES) | set(_LAZY))
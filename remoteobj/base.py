@@ -1,10 +1,15 @@
+import os
 import time
-import ctypes
+import queue
+import itertools
+import threading
 # import signal
 import warnings
 import multiprocessing as mp
-from .excs import RemoteException
-from . import util
+from .excs import RemoteException, ListenerOverloaded
+from .metrics import Metrics
+from .hooks import HOOKS, call_hooks
+from . import codec
 
 
 def make_token(name):
@@ -14,6 +19,10 @@ def make_token(name):
 
 FAIL_UNPICKLEABLE = False
 UNDEFINED = make_token('undefined')
+LISTENER_DIED = make_token('listener_died')
+
+# requests are tagged with (pid, n) so that we can tell which request a response is for
+_request_ids = itertools.count(1)
 
 UNPICKLEABLE_WARNING = (
     "You tried to send an unpickleable object returned by {view} "
@@ -29,18 +38,42 @@ UNPICKLEABLE_WARNING = (
 class BaseListener:
     _thread = None
     _delay = 1e-5
+    _liveness_interval = 0.005  # how often callers check that the listener is still alive
     _listener_proc = None
+    _profiler = None  # (cProfile.Profile, whole thread?) while profiling the listener
+    _heap_snapshot = None  # the last tracemalloc snapshot taken in the listener
+    _heap_started = False  # whether we started tracemalloc (so we only stop it if we did)
+    _recorder = None  # a Recorder while recording requests in the listener
+    _owner = None  # the listener's thread (thread_affine)
+    _thread_q = None  # requests from other threads in the listener's process (thread_affine)
     # _listener_process_name = None
-    _NOCOPY = ['_local', '_remote', '_llock', '_rlock', '_listener_ident']  # , '_listening_val'
-    def __init__(self, fulfill_final=True, default=UNDEFINED, __new=True, **kw):
+    _NOCOPY = ['_local', '_remote', '_llock', '_rlock', '_listener_ident', '_ready_r', '_ready_w', '_pending', '_heartbeat']  # , '_listening_val'
+    def __init__(self, fulfill_final=True, default=UNDEFINED, timeout=None, max_pending=None,
+                 drain_timeout=1, heartbeat_timeout=None, metrics=False, thread_affine=False,
+                 __new=True, **kw):
         # cross-process objects
         # self._listening_val = mp.Value('i', 0, lock=False)
         self._listener_ident = mp.Value('i', 0, lock=False)
+        # the last time the listener checked for requests
+        self._heartbeat = mp.Value('d', 0, lock=False)
         self._llock, self._rlock = mp.Lock(), mp.Lock()
+        # the callers that are waiting to send a request
+        self._pending = _Pending(max_pending)
         self._local, self._remote = mp.Pipe()
+        # readable while the listener is listening so we can wait on it (with process sentinels)
+        self._ready_r, self._ready_w = mp.Pipe(duplex=False)
         self._root = self  # isn't called when extending
         self._fulfill_final = fulfill_final
+        self._drain_timeout = drain_timeout
+        self._heartbeat_timeout = heartbeat_timeout
         self._default = default
+        self._timeout = timeout
+        self._max_pending = max_pending
+        # run requests from other threads in the listener's thread instead of theirs
+        self._thread_affine = thread_affine
+        # opt-in metrics for each side (see `stats_` and `listener_stats_`)
+        self._caller_metrics = Metrics('caller') if metrics else None
+        self._listener_metrics = Metrics('listener') if metrics else None
 
         # orig_handler = signal.getsignal(signal.SIGSEGV)
         # def sig_handler(signum, frame):
@@ -51,7 +84,9 @@ class BaseListener:
 
     def __getstate__(self):
         # NOTE: So we don't pickle queues, locks, and shared values.
-        return dict(self.__dict__, _thread=None, **{k: None for k in self._NOCOPY})
+        return dict(self.__dict__, _thread=None, _profiler=None, _heap_snapshot=None,
+                    _heap_started=False, _recorder=None,
+                    _owner=None, _thread_q=None, **{k: None for k in self._NOCOPY})
 
     # core inner workings
 
@@ -68,10 +103,12 @@ class BaseListener:
             raise exc
         return x
 
-    def _handle_no_listener(self, default=UNDEFINED):
+    def _handle_no_listener(self, default=UNDEFINED, died=False):
         # if a default value is provided, then return that, otherwise return a default.
         default = self._default if default == UNDEFINED else default
         if default == UNDEFINED:
+            if died:
+                raise RuntimeError('The remote listener for {} died before responding.'.format(self))
             raise RuntimeError('Remote instance is not running for {}'.format(self))
         elif callable(default):
             default = default()
@@ -79,73 +116,540 @@ class BaseListener:
 
     # remote calling interface
 
-    def process_requests(self):
-        '''Poll until the command queue is empty.'''
+    def process_requests(self, max_time=None, max_n=None):
+        '''Handle requests until there are none left, or until the budget runs out.
+
+        Args:
+            max_time (float): stop after this many seconds. This is checked
+                between requests so a slow request can still go over.
+            max_n (int): stop after handling this many requests.
+
+        Returns:
+            The number of requests that are still waiting.
+        '''
+        t0 = self._heartbeat.value = time.time()
         n = 0
-        while self._remote.poll():
+        while max_n is None or n < max_n:
+            left = None if max_time is None else max_time - (time.time() - t0)
+            if left is not None and left <= 0:
+                break
+            # if someone is waiting on the lock, give them a moment to send their request
+            wait = min(left or 1e-3, 1e-3) if self._pending.value > 0 else 0
+            if not self._thread_requests() and not self._remote.poll(wait):
+                if wait:  # no one sent anything. Make sure they're still around.
+                    self._pending.reap()
+                break
             self.poll()
-            time.sleep(self._delay)
             n += 1
-        return n
+        return self.pending_requests()
+
+    def pending_requests(self):
+        '''The number of requests that are waiting to be handled.'''
+        return self._pending.value + int(self._remote.poll()) + self._thread_requests()
+
+    def _thread_requests(self):
+        '''The number of requests waiting from other threads (thread_affine).'''
+        q = self._root._thread_q
+        return q.qsize() if q is not None else 0
 
     def cancel_requests(self):
+        '''Respond to any waiting requests without handling them. The callers
+        will get their default value.'''
         n = 0
         while self._remote.poll():
-            _ = self._remote.recv()
-            self._remote.send(None)
-            time.sleep(self._delay)
+            self._cancel_request()
             n += 1
         return n
 
+    def _cancel_request(self):
+        with self._rlock:
+            if self._remote.poll():
+                rid = self._recv(self._remote)[0]
+                self._send(self._remote, (rid, None))
+                if self._listener_metrics is not None:
+                    self._listener_metrics.cancelled += 1
+
     def poll(self, wait=False):
         '''Check for and execute the next command in the queue, if available.'''
-        if self._remote.poll():
-            with self._rlock:
-                request = self._remote.recv()
-                try:
-                    result = self._form_result(self._process(request))
-                except BaseException as e:
-                    self._remote.send((None, RemoteException(e)))
-                    return
+        self._heartbeat.value = time.time()
+        if self._thread_requests():
+            handled = self._poll_thread()
+            if handled is not False:
+                return handled
+        if not self._remote.poll():
+            return False
+        m = self._listener_metrics
+        traced = (m is not None or self._recorder is not None or
+                  HOOKS['before_process'] or HOOKS['after_process'])
+        t0 = time.perf_counter()
+        with self._rlock:
+            if not traced:
+                rid, deadline, request = self._recv(self._remote)
+                response, status = self._respond(deadline, request)
+                self._send_response(rid, response, request)
+                return status != 'error' or None
+
+            # the same thing, but measure everything
+            t1 = time.perf_counter()
+            sizes = []
+            rid, deadline, request = self._recv(self._remote, sizes)
+            info = self._trace_info(rid, request, deadline, size=sizes[0], lock_wait=t1 - t0)
+            call_hooks('before_process', info)
+            t1 = time.perf_counter()
+            response, status = self._respond(deadline, request)
+            dt = time.perf_counter() - t1
+            size = self._send_response(rid, response, request, measure=True)
+            if m is not None:
+                m.lock_wait.add(info['lock_wait'])
+                m.request_bytes.add(info['size'])
+                m.response_bytes.add(size)
+                if status == 'expired':
+                    m.timeouts += 1
+                else:
+                    m.record(info['shape'], dt, error=status == 'error')
+            call_hooks('after_process', dict(info, duration=dt, response_size=size, status=status))
+            if self._recorder is not None and not isinstance(request, _Control):
+                self._recorder.write(info['time'], request, info['size'], size, dt, status, deadline)
+            return status != 'error' or None
+
+    def _respond(self, deadline, request):
+        '''Handle a request and return the response and its status.'''
+        if deadline is not None and time.time() > deadline:
+            # the caller already gave up, so don't bother
+            return (None, TimeoutError('The request expired before it was handled.')), 'expired'
+        try:
+            return (self._form_result(self._run(request)), None), 'ok'
+        except BaseException as e:
+            return (None, RemoteException(e)), 'error'
 
-                # result came out fine
-                try:
-                    self._remote.send((result, None))
-                except RuntimeError as e:
-                    # handle exception that happens during serialization
-                    if FAIL_UNPICKLEABLE:
-                        raise RuntimeError(
-                            'Return value of {} is unpickleable.'.format(request)) from e
-                    warnings.warn(UNPICKLEABLE_WARNING.format(view=request, result=result))
-                    self._remote.send((None, None))
-            return True
-        return False
+    def _send_response(self, rid, response, request, measure=False):
+        '''Send a response. Returns its size if `measure`.'''
+        try:
+            return self._send(self._remote, (rid, response), measure)
+        except RuntimeError as e:
+            # handle exception that happens during serialization
+            if FAIL_UNPICKLEABLE:
+                raise RuntimeError(
+                    'Return value of {} is unpickleable.'.format(request)) from e
+            warnings.warn(UNPICKLEABLE_WARNING.format(view=request, result=response[0]))
+            return self._send(self._remote, (rid, (None, None)), measure)
+
+    def _run(self, request):
+        '''Handle a request in this process.'''
+        if isinstance(request, _Control):
+            return getattr(self, '_ctl_' + request.name)(*request.a, **request.kw)
+        if self._profiler is not None and not self._profiler[1]:
+            return self._profiler[0].runcall(self._process, request)
+        return self._process(request)
+
+    def _request_shape(self, request):
+        '''A short name for a kind of request, used to group metrics.'''
+        if isinstance(request, _Control):
+            return '<{}>'.format(request.name)
+        return type(request).__name__
+
+    def _request_view(self, request):
+        '''The request as it should be shown to hooks.'''
+        return request
+
+    def _trace_info(self, rid, request, deadline, **kw):
+        return dict(
+            rid=rid, view=self._request_view(request), shape=self._request_shape(request),
+            pid=os.getpid(), time=time.time(), deadline=deadline, **kw)
+
+    @staticmethod
+    def _send(conn, msg, measure=False):
+        '''Send a message (see `codec`). If `measure`, return how big it was.'''
+        buf = codec.dumps(msg)
+        conn.send_bytes(buf)
+        if measure:
+            return len(buf)
+
+    @staticmethod
+    def _recv(conn, sizes=None):
+        '''Receive a message. If `sizes` is a list, append how big it was.'''
+        buf = conn.recv_bytes()
+        if sizes is not None:
+            sizes.append(len(buf))
+        return codec.loads(buf)
 
     # parent calling interface
 
-    def _evaluate(self, request, default=UNDEFINED, default_local=False):
+    def _evaluate(self, request, default=UNDEFINED, default_local=False, timeout=UNDEFINED):
         '''Request the remote object to evaluate the proxy and return the value.
         If you are in the same process as the remote object, it will evaluate
         directly.
 
         Args:
             default (any): the value to return if the remote instance isn't listening.
+            timeout (float or None): raise a `TimeoutError` if we don't get a
+                response after this many seconds (including the time spent
+                waiting for other callers). Defaults to the proxy's timeout.
+                The listener will skip the request if it's still waiting
+                by then.
         '''
         if self._local_listener:  # if you're in the remote process, just run the function.
-            return self._process(request)
+            if self._thread_affine and threading.current_thread() is not self._root._owner:
+                return self._call_owner(request, default, timeout)
+            return self._run(request)
         if self.listening_:  # there's no way to disable a lock, so we need to check twice in order to avoid race conditions on closing
-            with self._llock:
-                if self.listening_:  # if the remote process is listening, run
-                    # send and wait for a result
-                    self._local.send(request)
-                    x = self._local.recv()
-                    if x is not None:
-                        return self._parse_response(x)
+            timeout = self._timeout if timeout == UNDEFINED else timeout
+            deadline = None if timeout is None else time.time() + timeout
+            x, sent = None, False
+            slot = self._pending.add(limit=self._max_pending)
+            if slot is None:
+                raise ListenerOverloaded('There are already {} requests waiting for {!r}.'.format(
+                    self._max_pending, self))
+            t0 = time.perf_counter()
+            try:
+                if not self._llock.acquire(timeout=timeout):
+                    if self._caller_metrics is not None:
+                        self._caller_metrics.timeouts += 1
+                    raise TimeoutError('Timed out waiting for other requests to {!r} after {}s.'.format(self, timeout))
+                try:
+                    if self.listening_:  # if the remote process is listening, run
+                        sent = True  # _send_request takes care of the pending slot from here
+                        x = self._send_request(request, deadline, t0, slot)
+                finally:
+                    self._llock.release()
+            finally:
+                if not sent:
+                    self._pending.remove(slot)
+            if x is LISTENER_DIED:
+                return self._handle_no_listener(default=default, died=True)
+            if x is not None:
+                return self._parse_response(x)
 
         if default_local:
-            return self._process(request)
+            return self._run(request)
         return self._handle_no_listener(default=default)
 
+    def _send_request(self, request, deadline, t0, slot=-1):
+        '''Send a request to the listener and wait for the response. `t0` is
+        when we started waiting for the lock and `slot` is the caller's
+        pending slot.'''
+        m = self._caller_metrics
+        traced = m is not None or HOOKS['before_send'] or HOOKS['after_recv']
+        rid = (os.getpid(), next(_request_ids))
+        msg = (rid, deadline, request)
+        if not traced:
+            try:
+                self._send(self._local, msg)
+            finally:
+                self._pending.remove(slot)
+            return self._recv_response(rid, deadline)
+
+        # the same thing, but measure everything
+        try:
+            buf = codec.dumps(msg)
+            info = self._trace_info(rid, request, deadline, size=len(buf),
+                                    lock_wait=time.perf_counter() - t0)
+            call_hooks('before_send', info)
+            t1 = time.perf_counter()
+            self._local.send_bytes(buf)
+        finally:
+            self._pending.remove(slot)
+
+        sizes, status = [], 'failed'
+        try:
+            x = self._recv_response(rid, deadline, sizes)
+            status = (
+                'died' if x is LISTENER_DIED else 'cancelled' if x is None else
+                'error' if x[1] is not None else 'ok')
+            return x
+        except TimeoutError:
+            status = 'timeout'
+            raise
+        finally:
+            dt = time.perf_counter() - t1
+            size = sizes[-1] if sizes else None
+            if m is not None:
+                m.lock_wait.add(info['lock_wait'])
+                m.request_bytes.add(info['size'])
+                if size is not None:
+                    m.response_bytes.add(size)
+                if status == 'timeout':
+                    m.timeouts += 1
+                else:
+                    m.cancelled += status == 'cancelled'
+                    m.record(info['shape'], dt, error=status in ('error', 'died', 'failed'))
+            call_hooks('after_recv', dict(info, duration=dt, response_size=size, status=status))
+
+    def _recv_response(self, rid, deadline=None, sizes=None):
+        '''Wait for the response to our request. Responses to earlier requests
+        that timed out are thrown away. Every so often, we check that the
+        listener process is still alive so we don't wait forever if it dies.'''
+        while True:
+            wait = self._liveness_interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.time(), 0))
+            if not self._local.poll(wait):
+                ident = self._listener_ident.value
+                if ident == 0:
+                    # it stopped without getting to us. It sends all of its
+                    # responses before clearing its ident, so check once more.
+                    if not self._local.poll(0):
+                        return None
+                else:
+                    alive = self._check_listener(ident)
+                    if alive is None:  # it might just be busy, so only this call gives up
+                        raise TimeoutError('{!r} has not checked for requests in {}s (heartbeat_timeout).'.format(
+                            self, self._heartbeat_timeout))
+                    if not alive:
+                        return LISTENER_DIED
+                    if deadline is not None and time.time() >= deadline:
+                        raise TimeoutError('No response from {!r} in time.'.format(self))
+                continue
+            resp_rid, x = self._recv(self._local, sizes)
+            if resp_rid == rid:
+                return x
+
+    def _call_owner(self, request, default=UNDEFINED, timeout=UNDEFINED):
+        '''Hand a request to the listener's thread and wait for it to run it
+        (thread_affine). Nothing is pickled - it's just a queue and a future.'''
+        from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeoutError
+        timeout = self._timeout if timeout == UNDEFINED else timeout
+        deadline = None if timeout is None else time.time() + timeout
+        owner = self._root._owner
+        fut = Future()
+        self._root._thread_q.put((fut, deadline, request))
+        while True:
+            wait = self._liveness_interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.time(), 0))
+            try:
+                return fut.result(wait)
+            except CancelledError:  # the listener stopped
+                return self._handle_no_listener(default=default)
+            except FutureTimeoutError:
+                if fut.done():  # the request raised it
+                    raise
+            alive = owner is not None and owner.is_alive()
+            if (not alive or not self.listening_) and fut.cancel():
+                return self._handle_no_listener(default=default, died=not alive)
+            if deadline is not None and time.time() >= deadline:
+                fut.cancel()
+                raise TimeoutError('No response from {!r} in time.'.format(self))
+
+    def _poll_thread(self, cancel=False):
+        '''Run (or cancel) the next request from another thread in this process.
+        Returns like `poll()`.'''
+        while True:
+            try:
+                fut, deadline, request = self._root._thread_q.get_nowait()
+            except queue.Empty:
+                return False
+            if cancel:
+                fut.cancel()
+            elif fut.set_running_or_notify_cancel():  # skip ones the caller gave up on
+                break
+        if deadline is not None and time.time() > deadline:
+            fut.set_exception(TimeoutError('The request expired before it was handled.'))
+            return True
+        try:
+            fut.set_result(self._run(request))
+        except BaseException as e:
+            fut.set_exception(e)
+            return None
+        return True
+
+    # listener controls - these run on the listener instead of the object
+
+    def _control(self, name, *a, default=None, timeout=UNDEFINED, **kw):
+        '''Call `self._ctl_{name}(*a, **kw)` in the listener process.'''
+        return self._evaluate(_Control(name, a, kw), default=default, timeout=timeout)
+
+    def stats_(self, format=None, reset=False):
+        '''Metrics for the requests made from this process. The proxy needs to
+        be created with `metrics=True`.
+
+        Args:
+            format (str or None): `None` for a dict, or `'prometheus'` for
+                the Prometheus text format.
+            reset (bool): reset the metrics after taking the snapshot.
+        '''
+        return self._export_metrics(self._caller_metrics, format, reset)
+
+    def listener_stats_(self, format=None, reset=False):
+        '''Metrics for the requests handled by the listener. If it's in another
+        process, they're requested from the listener (`None` if it isn't
+        listening). See `stats_` for the arguments.'''
+        return self._control('listener_stats', format=format, reset=reset)
+
+    def _ctl_listener_stats(self, format=None, reset=False):
+        return self._export_metrics(self._listener_metrics, format, reset)
+
+    def _export_metrics(self, m, format=None, reset=False):
+        if m is None:
+            raise RuntimeError('Metrics are disabled. Use Proxy(obj, metrics=True) to enable them.')
+        stats = m.export(format, pending=self.pending_requests())
+        if reset:
+            m.reset()
+        return stats
+
+    def profile_(self, seconds=5, sort='cumtime', limit=30, whole=False):
+        '''Profile the listener for a few seconds and return the stats as text.
+
+        Args:
+            seconds (float): how long to profile for.
+            sort (str): how to sort the stats, e.g. `'cumtime'`, `'tottime'`,
+                `'ncalls'` (see `pstats.Stats.sort_stats`).
+            limit (int or None): how many functions to show.
+            whole (bool): profile everything the listener thread does instead
+                of just handling requests (e.g. your code between calls to `poll()`).
+
+        Returns:
+            The `pstats` output, or `None` if the listener isn't running.
+        '''
+        if self.profile_start_(whole=whole) is None:
+            return None
+        try:
+            time.sleep(seconds)
+        finally:
+            stats = self.profile_stop_(sort=sort, limit=limit)
+        return stats
+
+    def profile_start_(self, whole=False):
+        '''Start profiling the listener with `cProfile`. See `profile_`.
+        Returns `None` if the listener isn't running.'''
+        return self._control('profile_start', whole=whole)
+
+    def profile_stop_(self, sort='cumtime', limit=30):
+        '''Stop profiling the listener and return the stats as text. See `profile_`.'''
+        return self._control('profile_stop', sort=sort, limit=limit)
+
+    def _ctl_profile_start(self, whole=False):
+        if self._profiler is not None:
+            raise RuntimeError('The listener for {!r} is already being profiled.'.format(self))
+        import cProfile
+        prof = cProfile.Profile()
+        if whole:
+            prof.enable()
+        self._profiler = prof, whole
+        return True
+
+    def _ctl_profile_stop(self, sort='cumtime', limit=30):
+        if self._profiler is None:
+            raise RuntimeError('The listener for {!r} is not being profiled.'.format(self))
+        prof, whole = self._profiler
+        self._profiler = None
+        if whole:
+            prof.disable()
+        import io
+        import pstats
+        out = io.StringIO()
+        try:
+            stats = pstats.Stats(prof, stream=out)
+        except TypeError:  # nothing was recorded
+            return 'No requests were handled while profiling.\n'
+        stats.sort_stats(sort).print_stats(*([limit] if limit is not None else []))
+        return out.getvalue()
+
+    def record_(self, path):
+        '''Start recording the requests that the listener handles to a file
+        (in the listener process). Use `remoteobj.record.replay` to play
+        them back. Requests made from the listener's own process aren't recorded.
+        Recording stops when the listener stops listening.'''
+        return self._control('record_start', path)
+
+    def record_stop_(self):
+        '''Stop recording requests. Returns the number of requests recorded.'''
+        return self._control('record_stop')
+
+    def _ctl_record_start(self, path):
+        if self._recorder is not None:
+            raise RuntimeError('The listener for {!r} is already recording to {}.'.format(self, self._recorder.path))
+        from .record import Recorder
+        self._recorder = Recorder(path)
+        return True
+
+    def _ctl_record_stop(self):
+        if self._recorder is None:
+            raise RuntimeError('The listener for {!r} is not recording.'.format(self))
+        rec, self._recorder = self._recorder, None
+        return rec.close()
+
+    def heap_snapshot_(self, top=20, key='lineno', diff=False, nframes=1):
+        '''Summarize the memory allocated in the listener process using `tracemalloc`.
+
+        The first call starts tracing, so it only knows about memory that's
+        allocated after that. Call it once early on and then use `diff=True`
+        to see what grew.
+
+        Args:
+            top (int): how many of the biggest allocation sites to return.
+            key (str): how to group allocations: `'lineno'`, `'filename'`,
+                or `'traceback'` (see `tracemalloc.Snapshot.statistics`).
+            diff (bool): compare with the previous snapshot and sort by what
+                grew the most.
+            nframes (int): how many frames to keep for each allocation, if
+                this starts tracing. Use more with `key='traceback'`.
+
+        Returns:
+            dict: ``{'current': bytes, 'peak': bytes, 'total': bytes, 'count': n,
+            'started': bool, 'top': [{'where': 'file.py:12', 'size': bytes,
+            'count': n, ('size_diff': bytes, 'count_diff': n)}, ...]}``,
+            or `None` if the listener isn't running.
+        '''
+        return self._control('heap_snapshot', top=top, key=key, diff=diff, nframes=nframes)
+
+    def heap_stop_(self):
+        '''Stop tracing memory allocations in the listener process, unless
+        something else started tracing. Returns whether it stopped.'''
+        return self._control('heap_stop')
+
+    def _ctl_heap_snapshot(self, top=20, key='lineno', diff=False, nframes=1):
+        import tracemalloc
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(nframes)
+            self._heap_started = True
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ])
+        prev, self._heap_snapshot = self._heap_snapshot, snapshot
+        stats = (
+            snapshot.compare_to(prev, key) if diff and prev is not None else
+            snapshot.statistics(key))
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'current': current, 'peak': peak, 'started': started,
+            'total': sum(s.size for s in stats), 'count': sum(s.count for s in stats),
+            'top': [_heap_stat(s, key) for s in stats[:top]],
+        }
+
+    def _ctl_heap_stop(self):
+        import tracemalloc
+        self._heap_snapshot = None
+        # leave it alone if the user was already tracing
+        stopped, self._heap_started = self._heap_started, False
+        if stopped:
+            tracemalloc.stop()
+        return stopped
+
+    def _check_listener(self, ident):
+        '''Check that the listener process is alive. If it isn't, then we stop
+        treating it as listening. If we can't check the process (e.g. on
+        Windows), this returns None once its heartbeat is older than
+        `heartbeat_timeout`, without touching anything, since it could just
+        be busy.'''
+        alive = pid_alive(abs(ident))
+        if alive is None:
+            return (
+                self._heartbeat_timeout is None or
+                time.time() - self._heartbeat.value < self._heartbeat_timeout) or None
+        if alive:
+            return True
+        if self._listener_ident.value == ident:  # in case a new one started
+            self._listener_ident.value = 0
+        self._set_ready(False)
+        # throw away anything it didn't get to so it isn't run by the next listener
+        while self._remote.poll():
+            self._remote.recv_bytes()
+        return False
+
     @property
     def _local_listener(self):
         '''Is the current process the main process or a child one?'''
@@ -176,22 +680,71 @@ class BaseListener:
     @listening_.setter
     def listening_(self, value):
         # set first so no one else can
-        prev = self._listener_ident.value > 0
+        ident = self._listener_ident.value
         if value:
+            if self._thread_affine:  # before anyone can see that we're listening
+                root = self._root
+                # the background thread, if there is one (see listen_(bg=True))
+                root._owner = self._thread if self._thread is not None else threading.current_thread()
+                if root._thread_q is None:
+                    root._thread_q = queue.SimpleQueue()
             self._listener_proc = p = mp.current_process()
+            self._heartbeat.value = time.time()
             self._listener_ident.value = p.ident
+            self._set_ready(True)
         else:
             self._listener_proc = None
+            if ident > 0:
+                # stop accepting requests, but keep our pid around while we
+                # finish up so callers can tell if we die
+                self._listener_ident.value = -ident
+                self._set_ready(False)
+                self._drain()
+                if self._recorder is not None:  # in case no one called record_stop_
+                    rec, self._recorder = self._recorder, None
+                    rec.close()
             self._listener_ident.value = 0
 
-            # make sure no one is left waiting.
-            if prev:
-                # there's a slight race condition between checking if we're still listening and sending the request
-                while is_locked(self._llock):
-                    if self._fulfill_final:
-                        self.process_requests()
-                    else:
-                        self.cancel_requests()
+    def _drain(self):
+        '''Make sure no one is left waiting after we stop listening. Requests from
+        callers that got in before we stopped are handled (or cancelled if
+        `fulfill_final=False`) until `drain_timeout` runs out, and then
+        the rest are cancelled.'''
+        handle = self.poll if self._fulfill_final else self._cancel_request
+        deadline = time.time() + self._drain_timeout
+        # other threads in this process
+        while self._thread_requests():
+            self._poll_thread(cancel=not self._fulfill_final or time.time() > deadline)
+        # callers waiting on the lock will see that we're not listening and
+        # leave, but one of them might have checked right before we stopped.
+        while self._pending.value > 0 or self._remote.poll():
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            if self._remote.poll(min(left, self._liveness_interval)):
+                handle()
+            else:  # don't wait on callers that were killed
+                self._pending.reap()
+        self.cancel_requests()
+
+    @property
+    def heartbeat_(self):
+        '''The number of seconds since the listener last checked for requests,
+        or `None` if it isn't listening. Useful for telling if a listener is stuck.'''
+        if not self.listening_:
+            return None
+        return time.time() - self._heartbeat.value
+
+    def _set_ready(self, ready):
+        '''Wake up anyone waiting for us to start listening (or reset it).'''
+        if self._ready_r is None:  # we were pickled
+            return
+        if ready:
+            if not self._ready_r.poll():
+                self._ready_w.send_bytes(b'1')
+        else:
+            while self._ready_r.poll():
+                self._ready_r.recv_bytes()
 
     # remote background listening interface
     '''
@@ -222,6 +775,7 @@ class BaseListener:
             return self
 
         if self._thread is None:
+            from . import util
             self._thread = util.thread(self._run_listener, raises_=False).start()
         return self
 
@@ -246,6 +800,10 @@ class BaseListener:
     def wait_until_listening(self, proc=None, fail=True, timeout=None):
         '''Wait until the remote instance is listening.
 
+        This blocks until the listener signals that it's ready (or the process
+        dies) instead of polling. To wait on many at once, use
+        `util.wait_until_listening`.
+
         Args:
             proc (mp.Process): If passed and the process dies, raise an error.
             fail (bool): Should it raise an exception if the process dies?
@@ -257,16 +815,8 @@ class BaseListener:
         Raises:
             `RuntimeError if fail == True and not proc.is_alive()`
         '''
-        t0 = time.time()
-        while not self.listening_:
-            if proc is not None and not proc.is_alive():
-                if fail:
-                    raise RuntimeError('Process is dead and the proxy never started listening.')
-                return False
-            time.sleep(self._delay)
-            if timeout and time.time() - t0 >= timeout:
-                raise TimeoutError('Remote listener never started listening.')
-        return True
+        from . import util
+        return util.wait_until_listening([self], [proc], fail=fail, timeout=timeout)
 
     def __enter__(self):
         self.listening_ = True
@@ -276,6 +826,101 @@ class BaseListener:
         self.stop_listen_()
 
 
+def _heap_stat(stat, key):
+    '''A compact version of a `tracemalloc.Statistic` (or `StatisticDiff`).'''
+    import tracemalloc
+    d = {'where': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        d.update(size_diff=stat.size_diff, count_diff=stat.count_diff)
+    if key == 'traceback':
+        d['traceback'] = stat.traceback.format()
+    return d
+
+
+class _Control:
+    '''A request for the listener itself (e.g. for its stats) rather than the object.'''
+    def __init__(self, name, a=(), kw=None):
+        self.name, self.a, self.kw = name, a, kw or {}
+
+
+class _Pending:
+    '''The callers that are waiting to send a request to a listener. Each one
+    takes a slot with its pid, so if it's killed while it's waiting (and
+    can't give it back), it can be dropped once its process is gone (see
+    `reap`). If all of the slots are taken, the extra callers aren't counted.
+    '''
+    size = 256
+    def __init__(self, size=None):
+        self._lock = mp.Lock()
+        self._pids = mp.Array('i', size or self.size, lock=False)  # 0 is a free slot
+        self._n = mp.Value('i', 0, lock=False)
+
+    @property
+    def value(self):
+        '''The number of waiting callers.'''
+        return self._n.value
+
+    def add(self, limit=None):
+        '''Take a slot for this caller. Returns the slot (-1 if they're all
+        taken) or None if there are already `limit` callers waiting.'''
+        pid = os.getpid()
+        with self._lock:
+            if limit is not None and self._n.value >= limit and not self._reap():
+                return None
+            pids, n = self._pids, len(self._pids)
+            i = (pid + threading.get_ident()) % n  # so threads don't all start at the same slot
+            for _ in range(n):
+                if not pids[i]:
+                    pids[i] = pid
+                    self._n.value += 1
+                    return i
+                i = (i + 1) % n
+        return -1
+
+    def remove(self, slot):
+        '''Give back a slot from `add`.'''
+        if slot < 0:
+            return
+        with self._lock:
+            if self._pids[slot]:
+                self._pids[slot] = 0
+                self._n.value -= 1
+
+    def reap(self):
+        '''Drop the callers whose process is gone. Returns how many were dropped.'''
+        with self._lock:
+            return self._reap()
+
+    def _reap(self):
+        pids, dropped = self._pids, 0
+        for i in range(len(pids)):
+            if pids[i] and pid_alive(pids[i]) is False:
+                pids[i] = 0
+                dropped += 1
+        self._n.value -= dropped
+        return dropped
+
+
+def pid_alive(pid):
+    '''Check if a process is running. Processes that have exited, but haven't
+    been joined yet (zombies) are considered dead. Returns `None` if we can't
+    tell, i.e. on Windows or if there's no procfs to check for zombies.'''
+    if os.name == 'nt':  # os.kill(pid, 0) would kill it
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # it exists, it's just not ours
+        pass
+    try:
+        with open('/proc/{}/stat'.format(pid), 'rb') as f:
+            # the state comes after the executable name, which is in parens
+            return f.read().rsplit(b')', 1)[1].split()[0] != b'Z'
+    except (OSError, IndexError):  # no procfs. It could be a zombie
+        return None
+
+
 def is_locked(lock):
     locked = lock.acquire(block=False)
     if locked:
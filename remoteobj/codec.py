@@ -0,0 +1,162 @@
+'''A compact binary encoding for the most common proxy messages.
+
+Most requests are views made of attributes, indexes, and calls without
+arguments (e.g. `obj.remote.x.get_()`, `obj.remote.items[3].get_()`,
+`obj.remote.count()`), and most results are small scalars. Pickling the
+nested tuples for those is a big part of a round trip, so they're packed
+with `struct` instead:
+
+    request:  kind (B) | pid (I) | n (Q) | deadline (d, NaN for None) | n ops (B) | ops...
+    response: kind (B) | pid (I) | n (Q) | value
+
+where each op is an op code followed by its key and values are a type tag
+followed by the value. Anything else (arguments, exceptions, other types,
+big strings) is pickled like before. Pickles start with `\\x80` so the two
+can share a pipe.
+'''
+import struct
+from multiprocessing.reduction import ForkingPickler
+
+
+__all__ = ['dumps', 'loads']
+
+ENABLED = True  # set to False to pickle everything
+MAX_SIZE = 4096  # the longest str/bytes to encode. Anything bigger is pickled.
+
+REQUEST, RESPONSE = 1, 2
+OP_ATTR, OP_ITEM, OP_CALL = b'\x01', b'\x02', b'\x03'
+
+_REQUEST = struct.Struct('<BIQdB')
+_RESPONSE = struct.Struct('<BIQ')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_LEN = struct.Struct('<I')
+_NAN = float('nan')
+# the same things as ints for decoding (indexing bytes gives an int)
+_ATTR, _ITEM, _CALL = OP_ATTR[0], OP_ITEM[0], OP_CALL[0]
+_I, _D, _S, _B = b'idsb'
+_CONSTANTS = {ord('N'): None, ord('T'): True, ord('F'): False}
+_CALL_KEY = ('()', ((), {}))
+
+
+def dumps(msg):
+    '''Serialize a message, using the binary encoding if we can.'''
+    if ENABLED:
+        buf = encode(msg)
+        if buf is not None:
+            return buf
+    return ForkingPickler.dumps(msg)
+
+
+def loads(buf):
+    '''Deserialize a message from `dumps`.'''
+    kind = buf[0]
+    if kind == REQUEST:
+        return _decode_request(buf)
+    if kind == RESPONSE:
+        return _decode_response(buf)
+    return ForkingPickler.loads(buf)
+
+
+def encode(msg):
+    '''Encode a `(rid, deadline, view keys)` request or a `(rid, (result, None))`
+    response. Returns `None` if it can't be encoded.'''
+    try:
+        if len(msg) == 3:
+            (pid, n), deadline, keys = msg
+            if type(keys) is not tuple or len(keys) > 255:
+                return None
+            parts = [_REQUEST.pack(REQUEST, pid, n, _NAN if deadline is None else deadline, len(keys))]
+            for kind, k in keys:
+                if kind == '.' and type(k) is str:
+                    x = _encode_value(k)
+                    if x is None:
+                        return None
+                    parts.append(OP_ATTR + x)
+                elif kind == '[]':
+                    x = _encode_value(k)
+                    if x is None:
+                        return None
+                    parts.append(OP_ITEM + x)
+                elif kind == '()' and _no_args(k):
+                    parts.append(OP_CALL)
+                else:
+                    return None
+            return b''.join(parts)
+
+        if len(msg) == 2:
+            (pid, n), response = msg
+            if type(response) is not tuple or len(response) != 2 or response[1] is not None:
+                return None
+            x = _encode_value(response[0])
+            return None if x is None else _RESPONSE.pack(RESPONSE, pid, n) + x
+    except (TypeError, ValueError, struct.error):
+        pass  # not a shape we know about
+    return None
+
+
+def _no_args(k):
+    return type(k) is tuple and len(k) == 2 and k[0] == () and type(k[1]) is dict and not k[1]
+
+
+def _encode_value(x):
+    t = type(x)
+    if x is None:
+        return b'N'
+    if x is True:
+        return b'T'
+    if x is False:
+        return b'F'
+    if t is int:
+        return b'i' + _INT.pack(x)  # raises struct.error if it's too big
+    if t is float:
+        return b'd' + _FLOAT.pack(x)
+    if t is str:
+        x = x.encode('utf-8')
+        return b's' + _LEN.pack(len(x)) + x if len(x) <= MAX_SIZE else None
+    if t is bytes:
+        return b'b' + _LEN.pack(len(x)) + x if len(x) <= MAX_SIZE else None
+    return None
+
+
+def _decode_value(buf, i):
+    '''Returns the value and the index after it.'''
+    tag = buf[i]
+    i += 1
+    if tag == _I:
+        return _INT.unpack_from(buf, i)[0], i + 8
+    if tag == _S or tag == _B:
+        size, = _LEN.unpack_from(buf, i)
+        i += 4
+        x = buf[i:i + size]
+        return (x.decode('utf-8') if tag == _S else x), i + size
+    if tag == _D:
+        return _FLOAT.unpack_from(buf, i)[0], i + 8
+    if tag in _CONSTANTS:
+        return _CONSTANTS[tag], i
+    raise ValueError('Unknown value tag: {!r}'.format(chr(tag)))
+
+
+def _decode_request(buf):
+    _, pid, n, deadline, count = _REQUEST.unpack_from(buf, 0)
+    i = _REQUEST.size
+    keys = []
+    for _ in range(count):
+        op = buf[i]
+        if op == _CALL:
+            keys.append(_CALL_KEY)
+            i += 1
+            continue
+        k, i = _decode_value(buf, i + 1)
+        if op == _ATTR:
+            keys.append(('.', k))
+        elif op == _ITEM:
+            keys.append(('[]', k))
+        else:
+            raise ValueError('Unknown op code: {}'.format(op))
+    return (pid, n), (None if deadline != deadline else deadline), tuple(keys)
+
+
+def _decode_response(buf):
+    _, pid, n = _RESPONSE.unpack_from(buf, 0)
+    return (pid, n), (_decode_value(buf, 13)[0], None)
@@ -1,5 +1,5 @@
 from .base import BaseListener, make_token, UNDEFINED
-from .view import View
+from .view import View, view_shape
 
 
 __all__ = ['get', 'Proxy']
@@ -26,10 +26,31 @@ class Proxy(View, BaseListener):
             basis.
         eager_proxy (bool): whether certain ops should evaluate automatically.
             These include: __call__, and passto. Default True.
+        timeout (float or None): the default number of seconds to wait for a
+            response before raising a `TimeoutError`. A late response is
+            thrown away. By default, it waits forever. Can be overridden
+            per call with `get_(timeout=...)`.
+        max_pending (int or None): the maximum number of callers that can be
+            waiting on the listener. Any more will raise `ListenerOverloaded`
+            right away instead of adding to the backlog. By default, there's no limit.
+        metrics (bool): record call counts, latencies, lock wait times, and
+            message sizes. See `stats_()` and `listener_stats_()`.
         fulfill_final (bool): If when closing the remote listener, there are pending
             requests, should the remote listener fulfill the requests or should it
             cancel them. By default, it will fulfill them, but if there are problems
             with that, you can disable that.
+        drain_timeout (float): how long the listener will spend fulfilling
+            pending requests when it closes. Anything left after that is cancelled.
+        heartbeat_timeout (float or None): where we can't check whether the
+            listener's process is alive (Windows, or no /proc to spot a dead
+            process that hasn't been joined), a call raises a `TimeoutError`
+            once the listener hasn't checked for requests in this many
+            seconds. The listener is left alone, since it might just be busy.
+            By default, callers wait forever.
+        thread_affine (bool): when other threads in the listener's process
+            use the proxy, run their requests in the listener's thread (in
+            `poll()`) instead of theirs. Requests are passed through a queue
+            with a future, so nothing is pickled.
 
     Usage:
     >>> proxy = Proxy(list)
@@ -63,6 +84,16 @@ class Proxy(View, BaseListener):
     def _process(self, request):
         return View(*request).resolve_view(self._obj)
 
+    def _request_shape(self, request):
+        if isinstance(request, tuple):
+            return view_shape(request)
+        return super()._request_shape(request)
+
+    def _request_view(self, request):
+        if isinstance(request, tuple):
+            return View(*request, frozen=True)
+        return super()._request_view(request)
+
     def _form_result(self, result):
         if result is self._obj:  # solution for chaining
             result = SELF
@@ -94,11 +125,11 @@ class Proxy(View, BaseListener):
         obj.__dict__ = dict(self.__dict__, **obj.__dict__)
         return obj
 
-    def __call__(self, *a, _default=UNDEFINED, _proxy=None, **kw):
+    def __call__(self, *a, _default=UNDEFINED, _proxy=None, _timeout=UNDEFINED, **kw):
         '''Automatically retrieve when calling a function.'''
         val = super().__call__(*a, **kw)
         if (self._eager_proxy if _proxy is None else _proxy):
-            val = val.get_(default=_default)
+            val = val.get_(default=_default, timeout=_timeout)
         return val
 
     # attribute
@@ -131,13 +162,13 @@ class Proxy(View, BaseListener):
 
     # other
 
-    def passto(self, func, *a, _default=UNDEFINED, _proxy=None, **kw):
+    def passto(self, func, *a, _default=UNDEFINED, _proxy=None, _timeout=UNDEFINED, **kw):
         '''Pass the object to a function as the first argument.
         e.g. `obj.remote.passto(str) => len(str)`
         '''
         val = super().passto(func, *a, **kw)
         if (self._eager_proxy if _proxy is None else _proxy):
-            val = val.get_(default=_default)
+            val = val.get_(default=_default, timeout=_timeout)
         return val
 
     def __contains__(self, key):
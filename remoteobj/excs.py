@@ -1,42 +1,124 @@
+import os
 import time
+import queue
+import itertools
 import collections
 import functools
+import threading
 import traceback
 import multiprocessing as mp
+import multiprocessing.connection
 import logging
 
 log_ = log = logging.getLogger(__name__)
 
 
-__all__ = ['Except', 'LocalExcept', 'RemoteException']
+__all__ = ['Except', 'LocalExcept', 'RemoteException', 'ListenerOverloaded']
+
+
+class ListenerOverloaded(RuntimeError):
+    '''Raised when there are already too many requests waiting on a remote
+    listener (see `Proxy(max_pending=...)`).'''
 
 
 # https://github.com/python/cpython/blob/5acc1b5f0b62eef3258e4bc31eba3b9c659108c9/Lib/concurrent/futures/process.py#L127
 class _RemoteTraceback(Exception):
+    '''The remote traceback. It can be a formatted string or a summary from
+    `_summarize_exc` which is only formatted once it's displayed.'''
+    _tb = None
     def __init__(self, tb):
-        self.tb = tb
+        self.summary = tb
     def __str__(self):
-        return self.tb
+        if self._tb is None:
+            self._tb = (
+                self.summary if isinstance(self.summary, str) else
+                '\n"""\n{}"""'.format(''.join(_format_summary(self.summary))))
+        return self._tb
+    tb = property(__str__)
 
 class RemoteException:
     '''A wrapper for exceptions that will preserve their tracebacks
     when pickling. Once unpickled, you will have the original exception
-    with __cause__ set to the formatted traceback.'''
+    with __cause__ set to the remote traceback.
+
+    Only the file, line, and function name of each frame is captured. The
+    traceback isn't formatted until someone displays it.'''
     def __init__(self, exc):
         self.exc = exc
-        self.tb = '\n"""\n{}"""'.format(''.join(
-            traceback.format_exception(type(exc), exc, exc.__traceback__)
-        ))
+        self.summary = _summarize_exc(exc)
+        self.time = time.time()
+    @property
+    def tb(self):
+        return str(_RemoteTraceback(self.summary))
     def __reduce__(self):
-        return _rebuild_exc, (self.exc, self.tb)
+        return _rebuild_exc, (self.exc, self.summary, self.time)
 
-def _rebuild_exc(exc, tb):
+def _rebuild_exc(exc, tb, t=None):
     exc.__cause__ = _RemoteTraceback(tb)
+    exc.__remoteobj_time__ = t
     return exc
 
 
-RETURN, YIELD, YIELDRETURN = '__return__', '__yield__', '__yield_return__'
-RESULT_KEYS = RETURN, YIELD, YIELDRETURN
+_CAUSE = '\nThe above exception was the direct cause of the following exception:\n\n'
+_CONTEXT = '\nDuring handling of the above exception, another exception occurred:\n\n'
+
+def _tb_frames(tb):
+    '''Get (filename, lineno, function name) for each frame in a traceback.'''
+    return tuple((f.f_code.co_filename, lineno, f.f_code.co_name)
+                 for f, lineno in traceback.walk_tb(tb))
+
+def _exc_name(exc):
+    cls = type(exc)
+    mod = cls.__module__
+    return cls.__qualname__ if mod in ('builtins', '__main__') else '{}.{}'.format(mod, cls.__qualname__)
+
+def _exc_str(exc):
+    try:
+        return str(exc)
+    except Exception:
+        return '<exception str() failed>'
+
+def _summarize_exc(exc):
+    '''Get a compact, picklable summary of an exception and its chained
+    exceptions. Returns a tuple of ``(name, message, frames, link)``, oldest
+    first, where ``link`` is the message joining it to the next exception.'''
+    chain, seen, link = [], set(), None
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        chain.append((_exc_name(exc), _exc_str(exc), _tb_frames(exc.__traceback__), link))
+        if exc.__cause__ is not None:
+            exc, link = exc.__cause__, _CAUSE
+        elif exc.__context__ is not None and not exc.__suppress_context__:
+            exc, link = exc.__context__, _CONTEXT
+        else:
+            exc = None
+    return tuple(reversed(chain))
+
+def _format_summary(summary):
+    '''Format an exception summary like `traceback.format_exception`.'''
+    lines = []
+    for name, msg, frames, link in summary:
+        if frames:
+            lines.append('Traceback (most recent call last):\n')
+            lines.extend(traceback.format_list([
+                traceback.FrameSummary(*f) for f in frames]))
+        lines.append('{}: {}\n'.format(name, msg) if msg else name + '\n')
+        if link:
+            lines.append(link)
+    return lines
+
+def _exc_signature(exc):
+    '''Identify repeated exceptions by their type, message, and traceback.'''
+    cause = exc.__cause__
+    frames = (
+        cause.summary if isinstance(cause, _RemoteTraceback) else
+        _tb_frames(exc.__traceback__))
+    return type(exc), _exc_str(exc), frames
+
+
+RETURN, YIELD, YIELDS, YIELDRETURN = '__return__', '__yield__', '__yields__', '__yield_return__'
+DONE = '__done__'  # the function has finished (used by pool workers)
+RESULT_KEYS = RETURN, YIELD, YIELDS, YIELDRETURN, DONE
 
 
 # class PipeQueue(mp.Pipe):
@@ -62,18 +144,45 @@ class LocalExcept:
             will only be recorded by the first (inner-most) context and higher contexts
             will ignore that exception. If False, every context up the chain
             will record the exception.
+        dedupe (bool): If True, repeated exceptions (same type, message, and
+            traceback) in a group are stored once. The stored exception keeps
+            track of how many times it was raised and when, as
+            `__remoteobj_count__`, `__remoteobj_first__`, and `__remoteobj_last__`.
+        max_per_group (int): The maximum number of exceptions to keep for
+            each group. Older exceptions are dropped once it's full, but they
+            are still counted in `stats()`. By default, there's no limit.
+        chunk_size (int): The maximum number of yielded values to send at once.
+        max_latency (float): The longest a yielded value waits before it's
+            sent. If the generator is still working on the next value when
+            it's up, a background thread sends the values collected so far.
+        max_buffer (int): The maximum number of chunks that can be waiting to
+            be consumed. Once it's full, the generator will block until the
+            results are read. By default, there's no limit.
     '''
     first = last = None
     _result = None
-    _is_yield = _is_yielding = False
-    def __init__(self, *types, raises=True, catch_once=True, log=False, log_tb=False):
+    _is_yield = _is_yielding = _is_done = False
+    def __init__(self, *types, raises=True, catch_once=True, log=False, log_tb=False,
+                 dedupe=False, max_per_group=None, chunk_size=128, max_latency=0.01,
+                 max_buffer=None):
         self.types = types or (Exception,)
         self.raises = raises
         self.catch_once = catch_once
+        self.dedupe = dedupe
+        self.max_per_group = max_per_group
         if log is True:
             log = log_
         self.log, self.log_tb = log, log_tb
         self._groups = {}
+        self._stats = {}
+        self._dupes = {}
+        self._callbacks = []
+        self.chunk_size, self.max_latency = chunk_size, max_latency
+        self._credits = self._make_credits(max_buffer) if max_buffer else None
+        self._cond = threading.Condition()
+
+    def _make_credits(self, n):
+        return threading.Semaphore(n)
 
     def __str__(self):
         return '<{} raises={} types={} {}{}>'.format(
@@ -83,7 +192,7 @@ class LocalExcept:
             'result type={}'.format(type(self._result)),
             ''.join(
                 '\n {:>15} [{} raised]{}'.format(
-                    '*default*' if name is None else name, len(excs),
+                    '*default*' if name is None else name, self._stats[name].count,
                     (' - last: ({}: {!r})'.format(type(excs[-1]).__name__, str(excs[-1]))
                      if excs else '')
                 )
@@ -118,26 +227,49 @@ class LocalExcept:
     def set(self, exc, name=None, mark=True):
         '''Assign an exception to a group. Also handles the special cases
         of return and yield values.'''
-        if name == RETURN:
-            self._result = exc
-            return
-        if name == YIELD:
-            if self._result is None:
-                self._result = collections.deque()
-                self._is_yield = self._is_yielding = True
-            self._result.append(exc)
-            return
-        if name == YIELDRETURN:
-            self._is_yield = True
-            self._is_yielding = False
+        if name in RESULT_KEYS:
+            with self._cond:
+                if name == RETURN:
+                    self._result = exc
+                elif name == YIELDRETURN:
+                    self._is_yield = True
+                    self._is_yielding = False
+                elif name == DONE:
+                    self._is_done = True
+                else:
+                    if self._result is None:
+                        self._result = collections.deque()
+                        self._is_yield = self._is_yielding = True
+                    # results are stored as chunks
+                    self._result.append([exc] if name == YIELD else exc)
+                self._cond.notify_all()
             return
 
         # handle exceptions and grouping
         if getattr(exc, '__remoteobj_caught__', name) != name:
             return
-        if name not in self._groups:
-            self._groups[name] = []
-        self._groups[name].append(exc)
+        t = getattr(exc, '__remoteobj_time__', None) or time.time()
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _GroupStats()
+        stats.add(exc, t)
+        if self._callbacks:
+            self._fire(exc, name)
+        if self.dedupe and self._dedupe(exc, name, t):
+            if mark:
+                self._mark(exc, name)
+            return
+
+        group = self._groups.get(name)
+        if group is None:
+            group = self._groups[name] = (
+                [] if self.max_per_group is None else
+                collections.deque(maxlen=self.max_per_group))
+        elif len(group) == self.max_per_group:  # the oldest is about to be dropped
+            stats.dropped += 1
+            if self.dedupe:
+                self._dupes.pop((name, _exc_signature(group[0])), None)
+        group.append(exc)
         if self.first is None:
             self.first = exc
         self.last = exc
@@ -147,16 +279,50 @@ class LocalExcept:
     def _mark(self, exc, name=None):
         exc.__remoteobj_caught__ = name
 
+    def on_error(self, callback, group=None):
+        '''Call ``callback(exc, name)`` whenever an exception is caught.
+
+        Args:
+            callback (callable): the function to call.
+            group (str): only call it for exceptions in this group. By default,
+                it's called for every group.
+        '''
+        self._callbacks.append((callback, group))
+        return callback
+
+    def _fire(self, exc, name=None):
+        for callback, group in self._callbacks:
+            if group is None or group == name:
+                try:
+                    callback(exc, name)
+                except Exception as e:
+                    log.exception(e)
+
+    def _dedupe(self, exc, name, t):
+        '''Count an exception against a matching one that we've already stored.
+        Returns True if it was a duplicate.'''
+        key = name, _exc_signature(exc)
+        prev = self._dupes.get(key)
+        if prev is None:
+            self._dupes[key] = exc
+            exc.__remoteobj_count__ = 1
+            exc.__remoteobj_first__ = exc.__remoteobj_last__ = t
+            return False
+        prev.__remoteobj_count__ += 1
+        prev.__remoteobj_last__ = t
+        self.last = prev
+        return True
+
     def get(self, name=None, latest=True):
         '''Get the last exception in the specified group, `name`.'''
         if name == ...:
             return self.last
-        excs = self.group(name)
+        excs = self._groups.get(name)
         return excs[-1 if latest else 0] if excs else None
 
     def group(self, name=None):
-        '''Get all exceptions in a group, `name`.'''
-        return self._groups.get(name) or []
+        '''Get all exceptions in a group, `name`, as a list.'''
+        return list(self._groups.get(name) or ())
 
     def raise_any(self, name=..., latest=True):
         '''Raise any exceptions that were collected. By default it will
@@ -179,16 +345,33 @@ class LocalExcept:
         '''Get all exceptions (from all groups) as a list.'''
         return [e for es in self._groups.values() for e in es]
 
+    def stats(self):
+        '''Get the exception counts for each group. These include exceptions
+        that were deduplicated or dropped from a full group.
+
+        Returns:
+            dict: ``{name: {'count': n, 'stored': n, 'dropped': n,
+            'types': {type name: n}, 'first': timestamp, 'last': timestamp}}``
+        '''
+        return {
+            name: dict(s.asdict(), stored=len(self._groups.get(name) or ()))
+            for name, s in self._stats.items()}
+
     def clear(self):
         '''Clear all exceptions and groups collected so far.'''
         self._groups.clear()
+        self._stats.clear()
+        self._dupes.clear()
         self.first = self.last = None
         self._result = None
-        self._is_yield = self._is_yielding = False
+        self._is_yield = self._is_yielding = self._is_done = False
 
-    def pull(self):
+    def pull(self, timeout=None):
         pass  # noop
 
+    def _waitables(self):
+        return []
+
     def wrap(self, func, result=True):
         '''Wrap a function to catch any exceptions raised. To re-raise the
         exception, run self.raise_any(). By default, it will also capture the
@@ -204,29 +387,50 @@ class LocalExcept:
             return x
 
     def set_result(self, x):
-        '''Set a function's result.'''
+        '''Set a function's result. Yielded values are sent in chunks (see
+        `chunk_size`, `max_latency`, and `max_buffer`).'''
         if hasattr(x,'__iter__') and not hasattr(x,'__len__'):
+            chunks = _Chunker(self._set_chunk, self.chunk_size, self.max_latency)
             try:
                 for xi in x:
-                    self.set(xi, YIELD)
+                    chunks.add(xi)
             finally:
+                chunks.close()
                 self.set(None, YIELDRETURN)
         else:
             self.set(x, RETURN)
 
-    def get_result(self, delay=1e-6):
-        '''Retrieve a function's result.'''
+    def _set_chunk(self, chunk):
+        if self._credits is not None:  # wait for the consumer to catch up
+            self._credits.acquire()
+        self.set(chunk, YIELDS)
+
+    def get_result(self):
+        '''Retrieve a function's result. If the function is a generator, this
+        will return a generator that waits for the values as they come in.'''
         if self._is_yield:
-            def results():
-                while True:
-                    if len(self._result):
-                        yield self._result.popleft()
-                    elif not self._is_yielding:
-                        return
-                    time.sleep(delay)
-            return results()
+            return self._iter_results()
         return self._result
 
+    def _iter_results(self):
+        while True:
+            if self._result:
+                chunk = self._result.popleft()
+                if self._credits is not None:
+                    self._credits.release()
+                yield from chunk
+            elif self._is_yielding:
+                self._wait(lambda: self._result or not self._is_yielding)
+            elif not self._result:  # in case a chunk came in before it finished
+                return
+
+    def _wait(self, ready, timeout=None):
+        '''Wait until ``ready()`` is true or until a result comes in. Callers
+        should check again after it returns.'''
+        with self._cond:
+            if not ready():
+                self._cond.wait(timeout)
+
     def clear_result(self):
         self._result = collections.deque() if self._is_yield else None
 
@@ -236,6 +440,62 @@ class LocalExcept:
         return result
 
 
+class _Chunker:
+    '''Collects yielded values and sends them in chunks. A chunk is sent once
+    it has `size` values or once `latency` seconds have passed since the last
+    one was sent. If the generator is busy when that time is up, a background
+    thread sends it so a slow generator doesn't hold back the values it
+    already yielded.'''
+    def __init__(self, send, size, latency):
+        self.send, self.size, self.latency = send, size, latency
+        self.chunk = []
+        self.deadline = None  # when the current chunk has to be sent by
+        self.closed = False
+        self._t_sent = time.monotonic()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, x):
+        with self._cond:
+            self.chunk.append(x)
+            if len(self.chunk) >= self.size or self.latency is not None and (
+                    time.monotonic() - self._t_sent >= self.latency):
+                self._flush()
+            elif self.latency is not None and self.deadline is None:
+                self.deadline = self._t_sent + self.latency
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='remoteobj-chunker', daemon=True)
+                    self._thread.start()
+                else:
+                    self._cond.notify()
+
+    def close(self):
+        '''Send whatever is left and stop the background thread.'''
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+            if self.chunk:
+                self._flush()
+
+    def _flush(self):
+        chunk, self.chunk, self.deadline = self.chunk, [], None
+        self.send(chunk)
+        self._t_sent = time.monotonic()
+
+    def _run(self):
+        with self._cond:
+            while not self.closed:
+                left = self.deadline and self.deadline - time.monotonic()
+                if left is None or left > 0:
+                    self._cond.wait(left)
+                    continue
+                try:
+                    self._flush()
+                except Exception as e:
+                    log.exception(e)
+
+
 # def blah(obj):
 #     look = {}
 #     def __init__(self, *a, **kw):
@@ -250,43 +510,136 @@ class LocalExcept:
 #         '__lookup': look, '__getstate__': __getstate__, '__setstate__': __setstate__
 #     })
 
-tblib = None
-try:
-    import tblib
-    import tblib.pickling_support
-except ImportError:
-    pass
+tblib = None  # optional. It's imported the first time we send an exception.
+_tblib_checked = False
+
+def _load_tblib():
+    global tblib, _tblib_checked
+    if not _tblib_checked:
+        _tblib_checked = True
+        try:
+            import tblib.pickling_support
+        except ImportError:
+            tblib = None
+    return tblib
+
 import weakref
 import warnings
+class _GroupStats:
+    '''Aggregate exception counts for a group.'''
+    __slots__ = ('count', 'dropped', 'types', 'first', 'last')
+    def __init__(self):
+        self.count = self.dropped = 0
+        self.types = collections.Counter()
+        self.first = self.last = None
+
+    def add(self, exc, t):
+        self.count += 1
+        self.types[type(exc).__name__] += 1
+        if self.first is None:
+            self.first = t
+        self.last = t
+
+    def asdict(self):
+        return dict(
+            count=self.count, dropped=self.dropped, types=dict(self.types),
+            first=self.first, last=self.last)
+
+
 class Except(LocalExcept):
     '''Catch exceptions in a remote process with their traceback and send them
-    back to be raised properly in the main process.'''
-    __Qs = {}
-    _Q_USE_WEAKREF = True
-    def __init__(self, *types, store_remote=True, manager=mp, **kw):
-        # self._local, self._remote = manager.Pipe()
-        self._q = manager.Queue()
-        self._q_id = id(self._q)
-        self.__Qs[self._q_id] = weakref.ref(self._q) if self._Q_USE_WEAKREF else self._q
-        # print(set(self.__Qs), self._q_id, mp.current_process().name)
+    back to be raised properly in the main process.
+
+    Messages are tagged with the id of the object that sent them and are
+    routed to that object when any object in this process pulls. Objects are
+    removed from the registry when they're garbage collected.
+
+    By default, each process that sends messages gets its own connection to
+    this one (see `_Inbox`). So if a process is killed (terminated, segfault,
+    etc.) while it's sending, it only loses its own message.
+
+    Args:
+        store_remote (bool): whether the remote copy should also keep the
+            exceptions it sends.
+        shared_queue (bool): send through a single `mp.Queue` shared by all of
+            the `Except` objects in this process instead. The queue has one
+            write lock, so a process that's killed while it's sending can block
+            all of them. `util.process.cancel` won't terminate these processes,
+            and for `util.pool` it has to be created before the pool.
+        manager: if provided, use a dedicated `manager.Queue()` for this object
+            (e.g. `mp.Manager()`).
+    '''
+    __Qs = {}    # {pid: shared queue} - one per process that creates Excepts
+    __excs = {}  # {id: weakref(Except)} - the objects that can receive messages
+    __ids = itertools.count(1)
+    # {queue: lock} - held while pulling so messages are set in the order they arrive
+    __pull_locks = weakref.WeakKeyDictionary()
+    def __init__(self, *types, store_remote=True, shared_queue=False, manager=None, **kw):
+        self._owner_pid = os.getpid()
+        self._q_id = next(self.__ids)
+        self._shared = shared_queue and manager is None
+        self._q = (
+            manager.Queue() if manager is not None else
+            self._shared_queue() if shared_queue else _Inbox.get())
+        self.__excs[self._q_id] = weakref.ref(
+            self, functools.partial(_discard_ref, self.__excs, self._q_id))
         self._store_remote = store_remote
         self._local_name = mp.current_process().name
         super().__init__(*types, **kw)
 
+    @classmethod
+    def _shared_queue(cls):
+        '''Get the queue shared by all Except objects owned by this process.'''
+        pid = os.getpid()
+        q = cls.__Qs.get(pid)
+        if q is None:
+            q = cls.__Qs[pid] = mp.Queue()
+        return q
+
+    @classmethod
+    def _shared_queues(cls):
+        '''The shared queues that exist in this process (e.g. to pass to a process started with spawn).'''
+        return dict(cls.__Qs)
+
+    @classmethod
+    def _set_shared_queue(cls, pid, q):
+        '''Use a queue inherited from another process (e.g. when using spawn).'''
+        cls.__Qs.setdefault(pid, q)
+
+    @classmethod
+    def _lookup(cls, q_id):
+        '''Get a live Except object by its id.'''
+        ref = cls.__excs.get(q_id)
+        return ref() if ref is not None else None
+
+    @classmethod
+    def _deliver(cls, q_id, x, name):
+        '''Set a message on the object that it was sent from.'''
+        exc = cls._lookup(q_id)
+        if exc is not None:
+            LocalExcept.set(exc, x, name)
+
     ### these methods are to prevent queues from being pickled
 
     def __getstate__(self):
-        # print(self.name, set(self.__Qs), self._q_id, mp.current_process().name)
-        return dict(self.__dict__, _q=None)
+        # the inbox only pickles its address
+        q = self._q if isinstance(self._q, _Inbox) else None
+        return dict(self.__dict__, _q=q, _cond=None, _credits=None, _callbacks=[])
 
     def __setstate__(self, state):
         self.__dict__ = state
-        self._q = q = self.__Qs.get(self._q_id)
-        if self._Q_USE_WEAKREF and q is not None:
-            self._q = self._q()
+        self._cond = threading.Condition()
+        exc = self._lookup(self._q_id)
+        if exc is not None:  # the original was inherited by this process
+            self._credits = exc._credits
+        if self._shared:
+            self._q = self.__Qs.get(self._owner_pid)
+        elif self._q is None:
+            self._q = exc._q if exc is not None else None
         if self._q is None:
-            warnings.warn('Queue for {} has been garbage collected and is no longer available. Creating a new one.'.format(self))
-            self._q = manager.Queue()
+            warnings.warn((
+                'Queue for {} is not available in this process. Exceptions '
+                'will only be stored locally.').format(self))
 
     #########
 
@@ -306,10 +659,16 @@ class Except(LocalExcept):
         self.pull()
         return super().all()
 
+    def stats(self):
+        self.pull()
+        return super().stats()
+
     def set(self, exc, name=None, mark=True): #, store=None
+        if os.getpid() == self._owner_pid:  # we're already home
+            return super().set(exc, name, mark=mark)
         r_exc = RemoteException(exc) if isinstance(exc, BaseException) else exc
-        self._q.put((r_exc, name))
-        # self._remote.send((r_exc, name))
+        if self._q is not None:
+            self._q.put((self._q_id, r_exc, name))
         # set exceptions on this side just in case
         if self._store_remote:
             super().set(exc, name, mark=mark)
@@ -318,25 +677,87 @@ class Except(LocalExcept):
 
     def _wrap_value(self, x):
         if isinstance(x, BaseException):
-            if tblib is None:
+            if _load_tblib() is None:
                 return RemoteException(x)
             tblib.pickling_support.install(type(x))
         return x
 
 
-    def get_result(self, **kw):
-        self.pull()
-        return super().get_result(**kw)
+    def _make_credits(self, n):
+        return mp.Semaphore(n)
 
-    def pull(self):
-        '''Pull any exceptions through the pipe. Used internally.'''
+    def get_result(self):
+        self.pull()
+        return super().get_result()
+
+    def on_error(self, callback, group=None):
+        '''Call ``callback(exc, name)`` whenever an exception arrives from a
+        remote process. A background thread waits on the queue so the callback
+        is called as soon as it arrives.
+
+        Args:
+            callback (callable): the function to call. It's called from the
+                background thread.
+            group (str): only call it for exceptions in this group. By default,
+                it's called for every group.
+        '''
+        super().on_error(callback, group)
+        _Collector.get().watch(self)
+        return callback
+
+    def _fire(self, exc, name=None):
+        if os.getpid() == self._owner_pid:  # not in the remote copies
+            super()._fire(exc, name)
+
+    def _wait(self, ready, timeout=None):
+        timeout = 0.1 if timeout is None else timeout
+        if self._can_pull and not _Collector.get().drains(self._q):
+            if not ready():
+                self.pull(timeout=timeout)
+        else:
+            super()._wait(ready, timeout)
+
+    def _waitables(self):
+        '''Objects that can be passed to `multiprocessing.connection.wait` which
+        will be ready when there's something to pull.'''
+        if not self._can_pull:
+            return []
+        if isinstance(self._q, _Inbox):
+            return self._q.waitables()
+        reader = getattr(self._q, '_reader', None)
+        return [reader] if reader is not None else []
+
+    @property
+    def _can_pull(self):
+        # only the owner can read from its inbox or the shared queue
+        return self._q is not None and (
+            os.getpid() == self._owner_pid or not (self._shared or isinstance(self._q, _Inbox)))
+
+    def pull(self, timeout=None):
+        '''Pull any exceptions through the queue. Used internally.
+
+        Args:
+            timeout (float): if provided, wait up to this long for a message.
+        '''
+        if not self._can_pull:
+            return
+        if isinstance(self._q, _Inbox):
+            self._q.pull(self._deliver, timeout)
+            return
+        lock = self.__pull_locks.get(self._q)
+        if lock is None:
+            lock = self.__pull_locks.setdefault(self._q, threading.RLock())
         try:
-            while not self._q.empty():
-                x = self._q.get(block=False)
-            # while self._local.poll():
-                # exc, name = self._local.recv()
-                if x:
-                    super().set(*x)
+            block = timeout is not None
+            with lock:  # e.g. the collector thread could be pulling too
+                while True:
+                    try:
+                        q_id, x, name = self._q.get(block=block, timeout=timeout)
+                    except queue.Empty:
+                        break
+                    block = False
+                    # messages for other objects get routed to them
+                    self._deliver(q_id, x, name)
         except (EOFError, FileNotFoundError, ConnectionRefusedError) as e:
             log.exception(e)
 
@@ -353,6 +774,192 @@ class Except(LocalExcept):
         return super().log_error(name, *a, **kw)
 
 
+def _discard_ref(registry, key, ref):
+    if registry.get(key) is ref:
+        registry.pop(key, None)
+
+
+class _Inbox:
+    '''Where messages for the `Except` objects owned by a process arrive.
+
+    The owner listens on a socket (a named pipe on Windows) and each process
+    connects the first time it sends something, so every sender has its own
+    connection. A process that dies in the middle of a message only breaks
+    its own connection, which is dropped. A background thread accepts the
+    connections and whoever pulls reads them. Once a sender exits, its
+    connection is closed the next time someone pulls.
+
+    Pickling an inbox only sends its address.
+    '''
+    __instances = {}  # {pid: the inbox owned by that process}
+    __conns = {}  # {address: (connection, lock)} - this process's connections to other inboxes
+    __lock = threading.Lock()
+    backlog = 64  # connections waiting to be accepted
+    def __init__(self, owner, address, listener=None):
+        self.owner = owner
+        self.address = address
+        self._listener = listener
+        if listener is not None:
+            self._readers = []
+            # held while reading and routing so messages are set in the order they were sent
+            self._lock = threading.RLock()
+            self._wake_r, self._wake_w = mp.Pipe(duplex=False)  # ready when there's a new connection
+            threading.Thread(target=self._accept, name='remoteobj-inbox', daemon=True).start()
+
+    @classmethod
+    def get(cls):
+        '''Get the inbox owned by this process.'''
+        pid = os.getpid()
+        with cls.__lock:
+            inbox = cls.__instances.get(pid)
+            if inbox is None:
+                listener = mp.connection.Listener(
+                    backlog=cls.backlog, authkey=mp.current_process().authkey)
+                inbox = cls.__instances[pid] = cls(pid, listener.address, listener)
+        return inbox
+
+    def __reduce__(self):
+        return _find_inbox, (self.owner, self.address)
+
+    @classmethod
+    def _find(cls, owner, address):
+        inbox = cls.__instances.get(owner)
+        return inbox if inbox is not None and inbox.address == address else cls(owner, address)
+
+    @classmethod
+    def _after_fork(cls):
+        # the connections belong to the parent. Sharing them would mean sharing a lock again.
+        for conn, _ in cls.__conns.values():
+            conn.close()
+        cls.__conns.clear()
+        cls.__lock = threading.Lock()
+
+    ### sending (any other process)
+
+    def put(self, msg):
+        '''Send a message to the owner.'''
+        try:
+            conn, lock = self._connection()
+            with lock:
+                conn.send(msg)
+        except (OSError, EOFError) as e:  # the owner is gone
+            self.__conns.pop(self.address, None)
+            log.warning('Could not send to process %d: %r', self.owner, e)
+
+    def _connection(self):
+        c = self.__conns.get(self.address)
+        if c is None:
+            with self.__lock:
+                c = self.__conns.get(self.address)
+                if c is None:
+                    conn = mp.connection.Client(self.address, authkey=mp.current_process().authkey)
+                    c = self.__conns[self.address] = conn, threading.Lock()
+        return c
+
+    ### receiving (the owner)
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (EOFError, ConnectionError, mp.AuthenticationError):
+                continue  # the handshake failed. Wait for the next one.
+            except OSError as e:
+                log.error('Stopped accepting connections on %s: %r', self.address, e)
+                return
+            self._readers.append(conn)
+            self._wake_w.send_bytes(b'')
+
+    def waitables(self):
+        '''Objects that can be passed to `multiprocessing.connection.wait`
+        which will be ready when there's something to pull.'''
+        return self._readers + [self._wake_r]
+
+    def pull(self, deliver, timeout=None):
+        '''Read everything that has arrived and call ``deliver(*message)``.
+
+        Args:
+            timeout (float): if provided, wait up to this long for something to arrive.
+        '''
+        if timeout:
+            mp.connection.wait(self.waitables(), timeout=timeout)
+        with self._lock:
+            while True:
+                ready = mp.connection.wait(self.waitables(), timeout=0)
+                if not ready:
+                    return
+                for r in ready:
+                    try:
+                        while r.poll():
+                            if r is self._wake_r:
+                                r.recv_bytes()
+                            else:
+                                deliver(*r.recv())
+                    except (EOFError, OSError):  # it exited (maybe in the middle of a message)
+                        self._drop(r)
+
+    def _drop(self, conn):
+        if conn in self._readers:
+            self._readers.remove(conn)
+        conn.close()
+
+def _find_inbox(owner, address):
+    return _Inbox._find(owner, address)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_Inbox._after_fork)
+
+
+class _Collector:
+    '''A background thread that waits on the queues of the watched `Except`
+    objects and pulls as soon as a message arrives. There's one per process.'''
+    _instances = {}
+    interval = 0.1  # how often to check for new queues
+    def __init__(self):
+        self._watched = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def get(cls):
+        pid = os.getpid()
+        c = cls._instances.get(pid)
+        if c is None:
+            c = cls._instances[pid] = cls()
+        return c
+
+    def watch(self, exc):
+        with self._lock:
+            self._watched.add(exc)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='remoteobj-collector', daemon=True)
+                self._thread.start()
+
+    def drains(self, q):
+        '''Is this queue being pulled by the background thread?'''
+        return self._thread is not None and any(e._q is q for e in list(self._watched))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # one object per queue - pulling it routes to all of the others
+                excs = list({id(e._q): e for e in list(self._watched) if e._can_pull}.values())
+                if not excs:
+                    self._thread = None
+                    return
+            readers = {r: e for e in excs for r in e._waitables()}
+            others = [e for e in excs if not e._waitables()]  # e.g. manager queues
+            if readers:
+                for r in mp.connection.wait(list(readers), timeout=self.interval):
+                    readers[r].pull()
+            else:
+                time.sleep(self.interval)
+            for e in others:
+                e.pull()
+            del excs, readers, others
+
+
 class _ExceptContext:
     def __init__(self, catch, name=None, raises=False, types=(), catch_once=True, log=False, log_tb=False):
         self.catch = catch
@@ -0,0 +1,61 @@
+'''Tracing hooks for proxy requests.
+
+>>> def trace(info):
+...     print(info['hook'], info['rid'], info['shape'], info['duration'])
+>>> remoteobj.add_hook('after_recv', trace)
+
+Hooks are called with a dict describing the request:
+ - `hook`: the hook name
+ - `rid`: the request id - `(caller pid, n)`. It's the same on both sides so
+   you can match up the caller and listener spans.
+ - `view`: the request (a `View` for proxies) and `shape`: a short name for it (e.g. `?.append()`)
+ - `pid`, `time`: the current process and `time.time()`
+ - `size`: the pickled size of the request
+ - `lock_wait`: seconds spent waiting on the request lock
+ - `deadline`: the request deadline (`time.time()`), if it has one
+
+And after the request is done (`after_recv`, `after_process`):
+ - `duration`: the round trip time (`after_recv`) or the execution time (`after_process`)
+ - `response_size`: the pickled size of the response
+ - `status`: `'ok'`, `'error'`, `'timeout'`, `'expired'`, `'cancelled'`, or `'died'`
+
+`before_send` and `after_recv` are called in the calling process, `before_process`
+and `after_process` are called in the listener process. Hooks are called
+synchronously so keep them fast. When no hooks are registered, they
+don't cost anything.
+'''
+import logging
+
+log = logging.getLogger(__name__)
+
+
+__all__ = ['add_hook', 'remove_hook']
+
+HOOK_NAMES = ('before_send', 'after_recv', 'before_process', 'after_process')
+HOOKS = {name: [] for name in HOOK_NAMES}
+
+
+def add_hook(name, func):
+    '''Call `func(info)` at a point in the request lifecycle. `name` is one of
+    `'before_send'`, `'after_recv'`, `'before_process'`, `'after_process'`.
+    Returns `func`.'''
+    if name not in HOOKS:
+        raise ValueError('Unknown hook {!r}. Expected one of {}'.format(name, HOOK_NAMES))
+    HOOKS[name].append(func)
+    return func
+
+
+def remove_hook(name, func=None):
+    '''Remove a hook. If `func` isn't given, remove all hooks for `name`.'''
+    if func is None:
+        HOOKS[name].clear()
+    else:
+        HOOKS[name].remove(func)
+
+
+def call_hooks(name, info):
+    for func in list(HOOKS[name]):
+        try:
+            func(dict(info, hook=name))
+        except Exception:
+            log.exception('Error in remoteobj %s hook %r', name, func)
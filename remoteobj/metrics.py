@@ -0,0 +1,188 @@
+'''Opt-in metrics for proxies (see `Proxy(metrics=True)`).
+
+Each process keeps its own metrics - the caller side records requests it
+makes and the listener side records requests it handles. Nothing here is
+shared between processes, so recording is just a few additions.
+'''
+import os
+import time
+import bisect
+import weakref
+import collections
+
+
+__all__ = ['Metrics', 'Histogram']
+
+LATENCY_BUCKETS = (
+    1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+    1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    '''A fixed-bucket histogram. `buckets` are the upper bounds.'''
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, x):
+        self.counts[bisect.bisect_left(self.buckets, x)] += 1
+        self.count += 1
+        self.sum += x
+        if x > self.max:
+            self.max = x
+
+    def quantile(self, q):
+        '''Estimate a quantile using the upper bound of the bucket it falls in.'''
+        if not self.count:
+            return None
+        target, total = q * self.count, 0
+        for le, n in zip(self.buckets, self.counts):
+            total += n
+            if total >= target:
+                return min(le, self.max)
+        return self.max
+
+    def cumulative(self):
+        '''[(upper bound, count <= upper bound), ..., ('+Inf', count)]'''
+        total, out = 0, []
+        for le, n in zip(self.buckets + ('+Inf',), self.counts):
+            total += n
+            out.append((le, total))
+        return out
+
+    def as_dict(self):
+        return {
+            'count': self.count, 'sum': self.sum, 'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99),
+            'buckets': self.cumulative(),
+        }
+
+
+class Metrics:
+    '''Metrics for one side (`'caller'` or `'listener'`) of a proxy.
+
+    Attributes:
+        calls (Counter): the number of requests by view shape (e.g. `?.append()`).
+        time (Counter): the total seconds spent by view shape.
+        latency (Histogram): round trip time for callers, execution time for listeners.
+        lock_wait (Histogram): time spent waiting on the request lock (`_llock`
+            for callers, `_rlock` for listeners).
+        request_bytes, response_bytes (Histogram): pickled message sizes.
+        errors (int): requests that raised an exception.
+        timeouts (int): requests that timed out (callers) or had already
+            expired when they were received (listeners).
+        cancelled (int): requests that were cancelled because the listener stopped.
+    '''
+    def __init__(self, side):
+        self.side = side
+        self.calls = collections.Counter()
+        self.time = collections.Counter()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.lock_wait = Histogram(LATENCY_BUCKETS)
+        self.request_bytes = Histogram(SIZE_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.reset()
+        _all_metrics.add(self)
+
+    def reset(self):
+        self.since = time.time()
+        self.calls.clear()
+        self.time.clear()
+        for h in (self.latency, self.lock_wait, self.request_bytes, self.response_bytes):
+            h.reset()
+        self.errors = self.timeouts = self.cancelled = 0
+
+    def record(self, shape, dt, error=False):
+        self.calls[shape] += 1
+        self.time[shape] += dt
+        self.latency.add(dt)
+        if error:
+            self.errors += 1
+
+    def export(self, format=None, **extra):
+        '''Get a snapshot of the metrics.
+
+        Arguments:
+            format (str or None): `None` for a dict or `'prometheus'` for
+                the Prometheus text format.
+            **extra: gauges to include, e.g. `pending=3`.
+        '''
+        if format == 'prometheus':
+            return self.prometheus(**extra)
+        if format is not None:
+            raise ValueError('Unknown metrics format: {!r}'.format(format))
+        return self.as_dict(**extra)
+
+    def as_dict(self, **extra):
+        return dict({
+            'side': self.side, 'since': self.since,
+            'calls': {k: {'count': n, 'time': self.time[k]} for k, n in self.calls.items()},
+            'errors': self.errors, 'timeouts': self.timeouts, 'cancelled': self.cancelled,
+            'latency': self.latency.as_dict(),
+            'lock_wait': self.lock_wait.as_dict(),
+            'request_bytes': self.request_bytes.as_dict(),
+            'response_bytes': self.response_bytes.as_dict(),
+        }, **extra)
+
+    def prometheus(self, prefix='remoteobj', labels=None, **extra):
+        '''Format the metrics as Prometheus text.'''
+        base = dict(labels or {}, side=self.side)
+        lines = []
+        def metric(name, kind, help):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+        def sample(name, value, **kw):
+            lines.append('{}_{}{} {}'.format(prefix, name, _labels(dict(base, **kw)), value))
+        def histogram(name, h, help):
+            metric(name, 'histogram', help)
+            for le, n in h.cumulative():
+                sample(name + '_bucket', n, le=le)
+            sample(name + '_sum', h.sum)
+            sample(name + '_count', h.count)
+
+        metric('calls_total', 'counter', 'Requests by view shape.')
+        for k, n in sorted(self.calls.items()):
+            sample('calls_total', n, view=k)
+        metric('call_seconds_total', 'counter', 'Time spent on requests by view shape.')
+        for k, t in sorted(self.time.items()):
+            sample('call_seconds_total', t, view=k)
+        for name, help in [('errors', 'Requests that raised.'),
+                           ('timeouts', 'Requests that timed out or expired.'),
+                           ('cancelled', 'Requests cancelled by the listener stopping.')]:
+            metric(name + '_total', 'counter', help)
+            sample(name + '_total', getattr(self, name))
+        histogram('latency_seconds', self.latency, 'Round trip (caller) or execution (listener) time.')
+        histogram('lock_wait_seconds', self.lock_wait, 'Time spent waiting on the request lock.')
+        histogram('request_bytes', self.request_bytes, 'Pickled request size.')
+        histogram('response_bytes', self.response_bytes, 'Pickled response size.')
+        for name, value in extra.items():
+            metric(name, 'gauge', name.replace('_', ' ').capitalize() + '.')
+            sample(name, value)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels.items()) + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# metrics inherited by a forked process belong to the parent, so start over
+_all_metrics = weakref.WeakSet()
+
+def _reset_after_fork():
+    for m in list(_all_metrics):
+        m.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,169 @@
+'''Record the requests a listener handles and replay them later.
+
+>>> obj.remote.record_('requests.log.gz')  # in the listener process
+>>> ...
+>>> obj.remote.record_stop_()
+>>> remoteobj.record.summarize('requests.log.gz')
+>>> with remoteobj.util.listener(other_obj):
+...     remoteobj.record.replay(other_obj.remote, 'requests.log.gz', speed=2)
+
+The log is a stream of pickled tuples (gzipped if the path ends with
+`.gz`). Each record has the time it arrived (relative to when recording
+started), the request (the view keys and their arguments), the request and
+response sizes, how long it took, its status, and its timeout.
+
+The log is flushed every `Recorder.flush_interval` seconds, so if the
+listener dies, you only lose the last few records. `read` stops at the
+end of what was written.
+'''
+import gzip
+import time
+import pickle
+import collections
+from .metrics import Histogram, SIZE_BUCKETS
+from .view import view_shape
+
+
+__all__ = ['Recorder', 'Record', 'read', 'replay', 'summarize']
+
+VERSION = 1
+
+Record = collections.namedtuple('Record', 'time request size response_size duration status timeout')
+
+
+def _open(path, mode):
+    return gzip.open(path, mode) if str(path).endswith('.gz') else open(path, mode)
+
+
+class Recorder:
+    '''Writes request records to a file. See `BaseListener.record_`.'''
+    flush_interval = 1  # seconds
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.start = time.time()
+        self._f = _open(path, 'wb')
+        pickle.dump({'version': VERSION, 'start': self.start}, self._f, pickle.HIGHEST_PROTOCOL)
+        self.flush()
+
+    def write(self, t, request, size, response_size, duration, status, deadline=None):
+        timeout = None if deadline is None else deadline - t
+        pickle.dump(
+            (t - self.start, request, size, response_size, duration, status, timeout),
+            self._f, pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+        if time.time() - self._t_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._f.flush()
+        self._t_flush = time.time()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *a):
+        self.close()
+
+
+def read(path):
+    '''Read the records from a log. Yields `Record`s. A log that was cut off
+    (e.g. the listener died) is read up to the last complete record.'''
+    with _open(path, 'rb') as f:
+        header = _load(f)
+        if header is None:  # nothing was written
+            return
+        if header.get('version') != VERSION:
+            raise ValueError('Unsupported request log version: {!r}'.format(header.get('version')))
+        while True:
+            rec = _load(f)
+            if rec is None:
+                return
+            yield Record(*rec)
+
+
+def _load(f):
+    '''Load the next pickle, or return `None` at the end of the file or a truncated record.'''
+    try:
+        return pickle.load(f)
+    except (EOFError, pickle.UnpicklingError):
+        return None
+
+
+def replay(proxy, path, speed=1, timeout=False):
+    '''Send the requests from a log to a proxy with the same timing.
+
+    Requests are sent one at a time, so if the listener is slower than the
+    original, it falls behind (see `lag` in the results).
+
+    Args:
+        proxy (Proxy): the proxy to send requests to.
+        path (str): the log file.
+        speed (float or None): how much faster to replay, e.g. `2` for twice
+            the original rate. `None` sends them as fast as possible.
+        timeout (bool or float or None): the timeout for each request. `False`
+            uses the recorded timeouts.
+
+    Returns:
+        dict: ``{'count': n, 'errors': n, 'timeouts': n, 'duration': seconds,
+        'ops_per_s': n, 'latency': {...}, 'lag': {...}}`` where `latency` and
+        `lag` (how late each request was sent) are histogram summaries.
+    '''
+    latency, lag = Histogram(), Histogram()
+    errors = timeouts = 0
+    t0 = time.time()
+    for rec in read(path):
+        if speed:
+            dt = t0 + rec.time / speed - time.time()
+            if dt > 0:
+                time.sleep(dt)
+            lag.add(max(-dt, 0))
+        t1 = time.perf_counter()
+        try:
+            proxy._evaluate(rec.request, default=None, timeout=rec.timeout if timeout is False else timeout)
+        except TimeoutError:
+            timeouts += 1
+        except Exception:
+            errors += 1
+        latency.add(time.perf_counter() - t1)
+    duration = time.time() - t0
+    return {
+        'count': latency.count, 'errors': errors, 'timeouts': timeouts,
+        'duration': duration, 'ops_per_s': latency.count / duration if duration else None,
+        'latency': latency.as_dict(), 'lag': lag.as_dict(),
+    }
+
+
+def summarize(path):
+    '''Describe a log: how many requests of each shape, how long it covers,
+    and the latency and size distributions.'''
+    shapes = collections.Counter()
+    statuses = collections.Counter()
+    duration, size, response_size = Histogram(), Histogram(SIZE_BUCKETS), Histogram(SIZE_BUCKETS)
+    t = 0
+    for rec in read(path):
+        shapes[view_shape(rec.request) if isinstance(rec.request, tuple) else type(rec.request).__name__] += 1
+        statuses[rec.status] += 1
+        duration.add(rec.duration)
+        size.add(rec.size)
+        if rec.response_size is not None:
+            response_size.add(rec.response_size)
+        t = rec.time
+    return {
+        'count': duration.count, 'time': t, 'rate': duration.count / t if t else None,
+        'shapes': dict(shapes.most_common()), 'status': dict(statuses),
+        'duration': duration.as_dict(), 'size': size.as_dict(), 'response_size': response_size.as_dict(),
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    import json
+    for path in sys.argv[1:]:
+        print(path)
+        print(json.dumps(summarize(path), indent=2, default=str))
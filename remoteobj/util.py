@@ -1,27 +1,32 @@
+import os
 import time
-import ctypes
+import pickle
+import itertools
 import functools
-from contextlib import contextmanager
+import collections
+from contextlib import contextmanager, ExitStack
+import weakref
 import threading
 import multiprocessing as mp
+import multiprocessing.connection
 import remoteobj
+from .excs import DONE, YIELDRETURN
 
 
 
 class _BackgroundMixin:
     _EXC_CLASS = remoteobj.Except
-    _wait_for_return = False
+    _join_sentinel = False
     def __init__(self, func, *a, results_=True, timeout_=None, raises_=True,
                  name_=None, group_=None, daemon_=True, exc_=None, close_=None, **kw):
         self.exc = self._EXC_CLASS() if exc_ is None else exc_
         self.join_timeout = timeout_
         self.join_raises = raises_
         self._closer = close_
-        if self._wait_for_return is not False:
-            self._wait_for_return = mp.Event()
+        self._cancel_flag = self._make_flag()
 
         super().__init__(
-            target=self._wrap(func, result=results_),
+            target=functools.partial(_run_job, self._cancel_flag, 1, self._wrap(func, result=results_)),
             args=a, kwargs=kw, name=name_,
             group=group_, daemon=daemon_)
 
@@ -46,52 +51,65 @@ class _BackgroundMixin:
     def __exit__(self, exc_type, exc_value, exc_tb):
         self.join()
 
-    _wait_timeout_interval = 0.1
-    _min_partial_timeout = 0.3
     def join(self, timeout=None, raises=None):
         timeout = self.join_timeout if timeout is None else timeout
 
         # this lets someone pass a function that will, say, do self.closing.set()
         if callable(self._closer):
             self._closer()
-        
+
         # for multiprocessing there is a scenario where we could experience a deadlock.
-        # Basically, OS Pipes are not infinitely big - so if a queue item is larger than 
-        # the Pipe limit, then there is a thread on the child process that will wait for 
+        # Basically, OS Pipes are not infinitely big - so if a queue item is larger than
+        # the Pipe limit, then there is a thread on the child process that will wait for
         # the main process to call get() so it can feed the (too large) object through.
-        # But if we call join without clearing the queue, then we'll just be forever waiting 
+        # But if we call join without clearing the queue, then we'll just be forever waiting
         # for each other.
-        # So - this uses a multiprocessing event to 
-        t0 = time.time()
-        if self._wait_for_return:
-            while self.is_alive() and (not timeout or (time.time() - t0) < timeout) and not self._wait_for_return.is_set():
-                self._wait_for_return.wait(timeout=self._wait_timeout_interval)
-            timeout = max(self._min_partial_timeout, timeout - (time.time() - t0)) if timeout else None
+        # So - we wait on the process sentinel and the queue at the same time and
+        # pull whenever something comes through.
+        if self._join_sentinel and self._popen is not None:
+            # once it has exited, join without a timeout so it gets reaped
+            timeout = None if self._wait_sentinel(timeout) else 0
 
         self.exc.pull()
         super().join(timeout=timeout)
         self.exc.pull()
+        if self.exc._is_yielding and not self.is_alive():
+            # it was killed before it finished yielding, so end the results here
+            self.exc.set(None, YIELDRETURN)
 
         if (self.join_raises if raises is None else raises):
             self.exc.raise_any()
 
+    def _wait_sentinel(self, timeout=None):
+        '''Wait until the process exits, pulling from the queue as messages come in.
+        Returns whether the process exited.'''
+        t0 = time.time()
+        while True:
+            left = max(0, timeout - (time.time() - t0)) if timeout else None
+            # the process might have connected since the last time
+            ready = mp.connection.wait([self.sentinel] + self.exc._waitables(), timeout=left)
+            if self.sentinel in ready:
+                return True
+            if not ready:  # timed out
+                return False
+            self.exc.pull()
+
     def raise_any(self):
         self.exc.raise_any()
 
+    def done(self):
+        '''Has the job finished?'''
+        return self.ident is not None and not self.is_alive()
+
     @property
     def result(self):
         return self.exc.get_result()
 
     def _wrap(self, func, *a, **kw):
-        wrapped = self.exc.wrap(func, *a, **kw)
-        @functools.wraps(func)
-        def wrapped_wait(*a, **kw):
-            try:
-                return wrapped(*a, **kw)
-            finally:
-                if self._wait_for_return:
-                    self._wait_for_return.set()
-        return wrapped_wait
+        return self.exc.wrap(func, *a, **kw)
+
+    def _make_flag(self):
+        return mp.RawValue('q', 0)
 
 
 
@@ -121,11 +139,38 @@ class process(_BackgroundMixin, mp.Process):
         **kwargs: the keyword args to pass to `func`
     '''
     _EXC_CLASS = remoteobj.Except
-    _wait_for_return = True
+    _join_sentinel = True
+
 
+    def cancel(self, terminate=None):
+        '''Ask the process to stop. The function can check `util.cancelled()`
+        and return early.
+
+        Arguments:
+            terminate (bool or None): whether to also terminate the process. By
+                default, it's terminated unless its `Except` sends through the
+                shared queue (``Except(shared_queue=True)``) because a process
+                that's killed while it's sending can leave that queue locked.
+
+        Returns:
+            whether it was terminated.
+        '''
+        if not self.is_alive():
+            return False
+        self._cancel_flag.value = 1
+        if terminate is None:
+            terminate = not self.exc._shared
+        if terminate:
+            self.terminate()
+        return bool(terminate)
+
+
+_sentinel_lock = threading.Lock()
 
 class thread(_BackgroundMixin, threading.Thread):
     _EXC_CLASS = remoteobj.LocalExcept
+    _finished = False
+    _sentinel_r = _sentinel_w = None
 
     @property
     def _identity(self):
@@ -134,11 +179,502 @@ class thread(_BackgroundMixin, threading.Thread):
     def throw(self, exc):
         raise_thread(exc, self)
 
+    def done(self):
+        return self._finished
+
+    def cancel(self):
+        '''Ask the thread to stop (see `util.cancelled`). Threads can't be
+        stopped from the outside, so this always returns False.'''
+        if not self._finished:
+            self._cancel_flag.value = 1
+        return False
+
+    def _make_flag(self):
+        return _Flag()
+
+    @property
+    def sentinel(self):
+        '''A file descriptor that will become ready when the thread finishes
+        (like `multiprocessing.Process.sentinel`). It's only created if you ask for it.'''
+        with _sentinel_lock:
+            if self._sentinel_r is None:
+                self._sentinel_r, w = os.pipe()
+                weakref.finalize(self, os.close, self._sentinel_r)
+                if self._finished:
+                    os.close(w)
+                else:
+                    self._sentinel_w = w
+        return self._sentinel_r
+
+    def _wrap(self, func, *a, **kw):
+        wrapped = super()._wrap(func, *a, **kw)
+        @functools.wraps(func)
+        def wrapped_finish(*a, **kw):
+            try:
+                return wrapped(*a, **kw)
+            finally:
+                with _sentinel_lock:
+                    self._finished = True
+                    if self._sentinel_w is not None:
+                        os.close(self._sentinel_w)
+                        self._sentinel_w = None
+        return wrapped_finish
+
+
+
+class _Flag:
+    '''`mp.RawValue` for jobs that don't need shared memory.'''
+    value = 0
+
+
+_current_job = threading.local()
+
+def cancelled():
+    '''Has the job running in this thread (a `util.process`, `util.thread`,
+    or `util.pool` job) been asked to stop? Long-running functions can check
+    this and return early when they're cancelled.
+
+    >>> def func():
+    ...     while not remoteobj.util.cancelled():
+    ...         yield do_some_work()
+    '''
+    flag, token = getattr(_current_job, 'flag', (None, None))
+    return flag is not None and flag.value == token
+
+def _run_job(flag, token, func, *a, **kw):
+    '''Run a job's function so it can see its cancel flag. `token` is the
+    value that means it was cancelled (workers reuse one flag for many jobs).'''
+    prev, _current_job.flag = getattr(_current_job, 'flag', (None, None)), (flag, token)
+    try:
+        return func(*a, **kw)
+    finally:
+        _current_job.flag = prev
 
 
 def job(*a, threaded_=True, **kw):
     return (thread if threaded_ else process)(*a, **kw)
 
+
+def as_completed(jobs, timeout=None):
+    '''Yield jobs (`util.process`, `util.thread`, or `util.pool` jobs) as
+    they finish. It waits on the process sentinels and `Except` queues
+    instead of polling.
+
+    Arguments:
+        jobs (list): the jobs. They should already be started.
+        timeout (float or None): raise a `TimeoutError` if they're not all
+            done after this many seconds.
+    '''
+    for job in _iter_finished(jobs, timeout):
+        job.join(raises=False)
+        yield job
+
+
+def join_all(jobs, timeout=None, fail_fast=True, raises=True):
+    '''Join a group of jobs (`util.process`, `util.thread`, or `util.pool` jobs).
+
+    Arguments:
+        jobs (list): the jobs. They should already be started.
+        timeout (float or None): raise a `TimeoutError` if they're not all
+            done after this many seconds.
+        fail_fast (bool): as soon as any job raises an exception, cancel the
+            jobs that are still running and stop waiting. Pending pool jobs are
+            dropped and running jobs are asked to stop (see `util.cancelled`).
+            Processes are also terminated (see `util.process.cancel`).
+            Anything else is left to finish.
+        raises (bool): raise the exception of the (first) failed job.
+
+    Returns:
+        the list of jobs.
+    '''
+    jobs = list(jobs)
+    for job in _iter_finished(jobs, timeout, failed=fail_fast):
+        if fail_fast and _has_failed(job):
+            # failed jobs are already on their way out
+            stopped = [j for j in jobs if not j.done() and not _has_failed(j) and j.cancel()]
+            for j in jobs:
+                if j.done() or j in stopped:
+                    j.join(raises=False)
+            if raises:
+                job.raise_any()
+            return jobs
+        job.join(raises=False)
+    if raises:
+        for job in jobs:
+            job.raise_any()
+    return jobs
+
+
+def _has_failed(job):
+    return job.exc.get(...) is not None
+
+
+def _iter_finished(jobs, timeout=None, failed=False):
+    '''Yield jobs as they finish (or as soon as they fail, if `failed`).'''
+    pending = list(jobs)
+    t0 = time.time()
+    while pending:
+        for job in pending:
+            job.exc.pull()
+        for job in [j for j in pending if j.done() or failed and _has_failed(j)]:
+            pending.remove(job)
+            yield job
+        if not pending:
+            return
+
+        left = timeout - (time.time() - t0) if timeout else None
+        if left is not None and left <= 0:
+            raise TimeoutError('{} jobs did not finish within {}s.'.format(len(pending), timeout))
+        waitables = {w for j in pending for w in j.exc._waitables()}
+        for j in pending:
+            sentinel = getattr(j, 'sentinel', None)
+            if sentinel is None:  # pool jobs - we might not see the queue if the collector pulls it first
+                left = min(left, 0.1) if left is not None else 0.1
+            else:
+                waitables.add(sentinel)
+        mp.connection.wait(list(waitables), timeout=left)
+
+
+_pool_ids = itertools.count(1)
+
+class pool:
+    '''A pool of long-lived worker processes. Submitted jobs have the same
+    interface as `util.process` (`.result`, `.raise_any()`, `.join()`, yield
+    streaming, named exception groups), but they reuse the same processes
+    instead of starting a new one each time. Workers that die are replaced.
+
+    Arguments:
+        n (int): the number of worker processes. Defaults to the number of CPUs.
+        name_ (str): the pool name, used to name the worker processes.
+
+    >>> with remoteobj.util.pool(4) as p:
+    ...     jobs = [p.submit(func, i) for i in range(10)]
+    ...     results = [j.join().result for j in jobs]
+    '''
+    def __init__(self, n=None, name_=None):
+        self.n = n or os.cpu_count() or 1
+        self.name = name_ or 'pool-{}'.format(next(_pool_ids))
+        # the workers need any shared queues our Except objects send through (when using spawn)
+        self._queues = remoteobj.Except._shared_queues()
+        self._lock = threading.RLock()
+        self._pending = collections.deque()
+        self._closing = False
+        self._wake_r, self._wake_w = mp.Pipe(duplex=False)
+        self._workers = [_PoolWorker(self, i) for i in range(self.n)]
+        self._idle = list(self._workers)
+        self._thread = threading.Thread(
+            target=self._manage, name='{}-manager'.format(self.name), daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return '<{} n={} pending={}>'.format(self.name, self.n, len(self._pending))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+        self.join()
+
+    def submit(self, func, *a, results_=True, timeout_=None, raises_=True, exc_=None, **kw):
+        '''Run ``func(*a, **kw)`` in one of the workers.
+
+        Arguments:
+            func (callable): the function to run. It needs to be picklable.
+            results_ (bool): whether to send back the return/yield values.
+            timeout_ (float or None): how long to wait while joining?
+            raises_ (bool): Whether or not to raise remote exceptions after
+                joining. Default is True.
+            exc_ (Except): the Except object to use. Pass your own if you
+                want to use named exception groups inside `func`.
+
+        Returns:
+            a job with `.result`, `.join()`, `.raise_any()`, `.done()`, and `.cancel()`.
+        '''
+        job = _PoolJob(self, func, a, kw, remoteobj.Except() if exc_ is None else exc_,
+                       results=results_, timeout=timeout_, raises=raises_)
+        with self._lock:
+            if self._closing:
+                raise RuntimeError('{} is closed.'.format(self))
+            self._pending.append(job)
+        self._wake()
+        return job
+
+    def close(self):
+        '''Stop accepting jobs. The workers exit once the pending jobs are done.'''
+        self._closing = True
+        self._wake()
+
+    def join(self, timeout=None):
+        '''Wait for the pending jobs to finish and the workers to exit.'''
+        self._thread.join(timeout)
+
+    def terminate(self, timeout=1):
+        '''Cancel pending jobs, ask the running ones to stop (see
+        `util.cancelled`), and kill the workers that are still busy after
+        `timeout` seconds. Killing a worker while it's sending a result can
+        leave the shared `Except` queue locked, so they get a chance to finish
+        first.'''
+        with self._lock:
+            self._closing = True
+            for job in list(self._pending):
+                job.cancel()
+            for w in self._workers:
+                if w.job is not None:
+                    w.job.cancel()
+        self._wake()
+        self._thread.join(timeout)
+        with self._lock:
+            for w in self._workers:
+                w.proc.terminate()
+        self._wake()
+
+    def _wake(self):
+        self._wake_w.send_bytes(b'')
+
+    def _manage(self):
+        '''Hand out jobs to idle workers and replace any workers that die.'''
+        while True:
+            with self._lock:
+                self._dispatch()
+                if self._closing and not self._pending and all(w.job is None for w in self._workers):
+                    break
+                conns = {w.conn: w for w in self._workers}
+                sentinels = {w.proc.sentinel: w for w in self._workers}
+            ready = mp.connection.wait([self._wake_r] + list(conns) + list(sentinels))
+            with self._lock:
+                # handle finished jobs before dead workers so we don't fail a job that finished
+                for r in sorted(ready, key=lambda r: r in sentinels):
+                    if r is self._wake_r:
+                        while self._wake_r.poll():
+                            self._wake_r.recv_bytes()
+                    elif r in conns:
+                        w = conns[r]
+                        try:
+                            r.recv()
+                        except (EOFError, OSError):
+                            continue  # it died. we'll see the sentinel
+                        w.job = None
+                        self._idle.append(w)
+                    elif r in sentinels:
+                        self._replace(sentinels[r])
+
+        for w in self._workers:
+            try:
+                w.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for w in self._workers:
+            w.proc.join()
+            w.conn.close()
+
+    def _dispatch(self):
+        while self._pending and self._idle:
+            job = self._pending.popleft()
+            w = self._idle.pop()
+            try:
+                w.conn.send(job._task)
+            except (OSError, ValueError):  # the worker died. we'll see the sentinel
+                self._pending.appendleft(job)
+                continue
+            w.job = job
+
+    def _replace(self, w):
+        w.proc.join()
+        if w in self._idle:
+            self._idle.remove(w)
+        if w.job is not None:
+            w.job._fail(RuntimeError('Pool worker {} died (exit code {}) while running {}.'.format(
+                w.proc.name, w.proc.exitcode, w.job.name)))
+        w.conn.close()
+        i = self._workers.index(w)
+        if self._closing:
+            del self._workers[i]
+            return
+        self._workers[i] = nw = _PoolWorker(self, i)
+        self._idle.append(nw)
+
+
+class _PoolWorker:
+    def __init__(self, pool, i):
+        self.job = None
+        self.conn, child = mp.Pipe()
+        self.cancel_flag = mp.RawValue('q', 0)  # the token of the job to cancel
+        self.proc = mp.Process(
+            target=_pool_worker, args=(child, pool._queues, self.cancel_flag),
+            name='{}-worker-{}'.format(pool.name, i), daemon=True)
+        self.proc.start()
+        child.close()
+
+
+def _pool_worker(conn, queues, cancel_flag):
+    for pid, q in queues.items():  # when using spawn
+        remoteobj.Except._set_shared_queue(pid, q)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if task is None:
+            return
+        token, exc, payload = task
+        with exc(raises=False):
+            func, a, kw, results = pickle.loads(payload)
+            _run_job(cancel_flag, token, exc.wrap(func, result=results), *a, **kw)
+        exc.set(None, DONE)
+        conn.send(None)  # ready for the next one
+
+
+_job_tokens = itertools.count(1)
+
+class _PoolJob:
+    '''A job submitted to `util.pool`. It has the same interface as `util.process`
+    for results and exceptions.'''
+    def __init__(self, pool, func, a, kw, exc, results=True, timeout=None, raises=True):
+        self.pool = pool
+        self.exc = exc
+        self.name = getattr(func, '__name__', None) or str(func)
+        self.join_timeout = timeout
+        self.join_raises = raises
+        self._token = next(_job_tokens)
+        self._task = self._token, exc, pickle.dumps((func, a, kw, results))
+
+    def __repr__(self):
+        return '<{} {} done={}>'.format(self.__class__.__name__, self.name, self.exc._is_done)
+
+    def done(self):
+        '''Has the job finished?'''
+        self.exc.pull()
+        return self.exc._is_done
+
+    def join(self, timeout=None, raises=None):
+        '''Wait for the job to finish.'''
+        timeout = self.join_timeout if timeout is None else timeout
+        t0 = time.time()
+        while not self.exc._is_done:
+            left = timeout - (time.time() - t0) if timeout else None
+            if left is not None and left <= 0:
+                break
+            self.exc._wait(lambda: self.exc._is_done, min(left, 0.1) if left else 0.1)
+        self.exc.pull()
+        if (self.join_raises if raises is None else raises):
+            self.exc.raise_any()
+        return self
+
+    def cancel(self):
+        '''Cancel the job if it hasn't started yet. If it's running, it's asked
+        to stop (see `util.cancelled`). Returns whether it was cancelled before
+        it started.'''
+        with self.pool._lock:
+            try:
+                self.pool._pending.remove(self)
+            except ValueError:
+                for w in self.pool._workers:
+                    if w.job is self:
+                        w.cancel_flag.value = self._token
+                return False
+        self.exc.set(None, DONE)
+        return True
+
+    def raise_any(self):
+        self.exc.raise_any()
+
+    @property
+    def result(self):
+        return self.exc.get_result()
+
+    def _fail(self, exc):
+        self.exc.set(exc)
+        self.exc.set(None, DONE)
+
+
+def pmap(func, iterable, workers=None, ordered=True, chunksize=1, pool_=None):
+    '''A parallel `map` that streams the results back as they finish.
+
+    Items are read from `iterable` lazily, as workers free up. If `func`
+    raises, the remote exception (with its remote traceback) is raised when
+    you reach the item that raised it. The item's index is stored as
+    `exc.__remoteobj_index__`.
+
+    Arguments:
+        func (callable): the function to call on each item. It needs to be picklable.
+        iterable: the items to pass to `func`.
+        workers (int): the number of worker processes. Defaults to the number of CPUs.
+        ordered (bool): whether to yield the results in the same order as the
+            items. If False, they're yielded as soon as they're done.
+        chunksize (int): the number of items to send to a worker at once.
+        pool_ (util.pool): an existing pool to use. By default, a new one
+            is created and closed once we're done.
+
+    >>> for y in remoteobj.util.pmap(func, range(100), workers=4):
+    ...     print(y)
+    '''
+    p = pool(workers) if pool_ is None else pool_
+    chunks = _chunks(iterable, chunksize)
+    inflight = collections.deque()
+    try:
+        while True:
+            while len(inflight) < 2 * p.n:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                inflight.append((chunk[0], p.submit(_map_chunk, func, chunk[1], raises_=False)))
+            if not inflight:
+                break
+            if ordered:
+                start, job = inflight.popleft()
+                job.join(raises=False)
+            else:
+                start, job = _pop_done(inflight)
+            yield from _chunk_results(start, job)
+    finally:
+        # if we're bailing early, the chunks that are running stop at the next item
+        for _, job in inflight:
+            job.cancel()
+        if pool_ is None:
+            p.close()
+            p.join()
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    for start in itertools.count(0, size):
+        xs = list(itertools.islice(it, size))
+        if not xs:
+            return
+        yield start, xs
+
+
+def _map_chunk(func, xs):
+    for x in xs:
+        if cancelled():
+            return
+        yield func(x)
+
+
+def _pop_done(inflight):
+    '''Wait for any job to finish and remove it.'''
+    ready = lambda: any(job.exc._is_done for _, job in inflight)
+    while not ready():
+        # they all share a queue so pulling one routes messages to the others
+        inflight[0][1].exc._wait(ready, 0.1)
+    item = next(item for item in inflight if item[1].exc._is_done)
+    inflight.remove(item)
+    return item
+
+
+def _chunk_results(start, job):
+    i = start
+    for x in job.result or ():
+        yield x
+        i += 1
+    exc = job.exc.get(...)
+    if exc is not None:
+        exc.__remoteobj_index__ = i
+        if hasattr(exc, 'add_note'):
+            exc.add_note('Raised by item {} in pmap.'.format(i))
+        raise exc
+
 # Helpers for tests and what not
 
 def mprint(*a, end='\n', **kw):
@@ -170,8 +706,17 @@ def set_faulthandler(dumps=None):  # TODO make context manager - but how to rest
 
 @contextmanager
 def listener(obj, bg=None, wait=True, callback=None, wait_timeout=10, join_timeout=10, **kw):
+    '''Run a listener for `obj.remote` in another process. Extra keyword
+    arguments are passed to the listener loop, e.g. `max_time=0.002, max_n=50`
+    to limit how long each call to `process_requests` can take between
+    calls to `callback`.
+
+    By default, a `callback` runs while a background thread handles the
+    requests, unless there's a budget (`max_time` or `max_n`), which needs
+    them to take turns.
+    '''
     if bg is None:
-        bg = callable(callback)
+        bg = callable(callback) and not kw.keys() & {'max_time', 'max_n'}
     func = (
         bg if callable(bg) else
         _run_remote_bg if bg else
@@ -187,6 +732,64 @@ def listener(obj, bg=None, wait=True, callback=None, wait_timeout=10, join_timeo
 
 dummy_listener = listener
 
+
+@contextmanager
+def listeners(objs, wait=True, wait_timeout=10, **kw):
+    '''Start a listener process for each object (see `listener`) and wait for
+    them to start listening all at once.
+
+    >>> with remoteobj.util.listeners(objs) as procs:
+    ...     results = [o.remote.x.get_() for o in objs]
+    '''
+    objs = list(objs)
+    with ExitStack() as stack:
+        procs = [stack.enter_context(listener(obj, wait=False, **kw)) for obj in objs]
+        if wait:
+            wait_until_listening([obj.remote for obj in objs], procs, timeout=wait_timeout)
+        yield procs
+
+
+def wait_until_listening(proxies, procs=None, fail=True, timeout=None):
+    '''Wait until all of the proxies are listening. They're waited on together
+    so starting up a bunch of listener processes only takes as long as the
+    slowest one.
+
+    Arguments:
+        proxies (list): the proxies, e.g. `[obj.remote for obj in objs]`.
+        procs (list or None): the process running each proxy's listener (or
+            `None`). If one dies before its proxy is listening, we'll stop waiting.
+        fail (bool): Should it raise an exception if a process dies?
+            Otherwise it would just return `False`.
+        timeout (float or None): raise a `TimeoutError` if they aren't
+            listening after this many seconds.
+
+    Returns:
+        Whether they're all listening.
+    '''
+    proxies = list(proxies)
+    procs = [None] * len(proxies) if procs is None else list(procs)
+    t0 = time.time()
+    while True:
+        pending = [(x, p) for x, p in zip(proxies, procs) if not x.listening_]
+        if not pending:
+            return True
+        if any(p is not None and not p.is_alive() for _, p in pending):
+            if fail:
+                raise RuntimeError('Process is dead and the proxy never started listening.')
+            return False
+        left = timeout - (time.time() - t0) if timeout else None
+        if left is not None and left <= 0:
+            raise TimeoutError('Remote listener never started listening.')
+
+        waitables = []
+        for x, p in pending:
+            sentinel = getattr(p, 'sentinel', None)
+            if x._ready_r is None or p is not None and sentinel is None:
+                # we can't wait on one of them, so check back in a bit
+                left = min(left, 0.01) if left is not None else 0.01
+            waitables.extend(w for w in (x._ready_r, sentinel) if w is not None)
+        mp.connection.wait(waitables, timeout=left)
+
 def listener_func(func):
     '''Wrap a function that get's called repeatedly in a remote process with
     remote object listening. Use as a contextmanager.
@@ -197,10 +800,10 @@ def listener_func(func):
     return inner
 
 
-def _run_remote(obj, event, callback=None, delay=1e-5):  # some remote job
+def _run_remote(obj, event, callback=None, delay=1e-5, max_time=None, max_n=1):  # some remote job
     with obj.remote:
         while not event.is_set():
-            obj.remote.poll()
+            obj.remote.process_requests(max_time=max_time, max_n=max_n)
             callback and callback(obj)
             time.sleep(delay)
 
@@ -221,6 +824,7 @@ def raise_thread(exc, name='MainThread'):
     | if the thread to kill is blocked at some I/O or sleep(very_long_time)
     Maybe we can retry it or something?
     '''
+    import ctypes
     tid = ctypes.c_long(find_thread(name, require=True).ident)
     ret = ctypes.pythonapi.PyThreadState_SetAsyncExc(tid, ctypes.py_object(exc))
     if ret == 0:
@@ -7,6 +7,32 @@ def _fmt_args(*a, **kw):
         ['{}={!r}'.format(k, v) for k, v in kw.items()])
 
 
+def view_shape(keys):
+    '''Describe a view without its arguments or keys, e.g. `?.append()`.
+    Used to group metrics.'''
+    x = '?'
+    for kind, k in keys:
+        if kind == '.':
+            x = '{}.{}'.format(x, k)
+        elif kind == '.=':
+            x = '{}.{} ='.format(x, k[0])
+        elif kind == 'del.':
+            x = 'del {}.{}'.format(x, k)
+        elif kind in ('[]', '()'):
+            x = x + kind
+        elif kind == '[]=':
+            x = '{}[] ='.format(x)
+        elif kind == 'del[]':
+            x = 'del {}[]'.format(x)
+        elif kind == 'f()':
+            x = '{}({})'.format(getattr(k[0], '__name__', '?'), x)
+        elif kind == 'len':
+            x = 'len({})'.format(x)
+        elif kind == 'in':
+            x = '? in {}'.format(x)
+    return x
+
+
 class View:
     '''Represents a set of operations that can be captured, pickled, and
     applied to a remote object.
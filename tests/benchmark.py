@@ -1,13 +1,43 @@
+'''Benchmarks for remoteobj.
+
+    PYTHONPATH=. python tests/benchmark.py                          # run everything
+    PYTHONPATH=. python tests/benchmark.py roundtrip payload        # just some of them
+    PYTHONPATH=. python tests/benchmark.py --quick -o before.json   # save the results
+    PYTHONPATH=. python tests/benchmark.py --compare before.json    # fail if something got slower
+    PYTHONPATH=. python tests/benchmark.py --compare before.json after.json  # compare two runs
+
+Each benchmark returns `{case: {metric: value}}`. Metrics ending in `_per_s`
+are better when they're higher, everything else (seconds, bytes, counts)
+is better when it's lower. Times are in seconds. Counts of things that
+leak (`COUNT_METRICS`) are regressions if they go up at all.
+'''
+import os
+import gc
+import sys
+import json
 import time
-import timeit
-from contextlib import contextmanager
+import platform
+import argparse
+import subprocess
+import multiprocessing as mp
+import multiprocessing.managers
 import remoteobj
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import simple
-# import reip
+
+
+BENCHMARKS = {}
+
+def benchmark(func):
+    BENCHMARKS[func.__name__.replace('bench_', '')] = func
+    return func
+
 
 class Obj:
-    def __init__(self, proxycls=remoteobj.Proxy):
-        self.remote = proxycls(self)
+    value = 5
+    def __init__(self, proxycls=remoteobj.Proxy, **kw):
+        self.remote = proxycls(self, **kw)
 
     def boolean(self):
         return True
@@ -21,107 +51,328 @@ class Obj:
     def string(self):
         return 'asdfasdfasdf'
 
-    @property
-    def prop(self):
-        return True
+    def echo(self, x):
+        return x
 
     def me(self):
         return self
 
 
+# helpers
 
-# calls = [
-#     'obj.remote.boolean()',
-#     'obj.remote.integer()',
-#     'obj.remote.number()',
-#     'obj.remote.string()',
-#     # 'obj.remote.prop.__',
-#     'obj.remote.me()',
-# ]
-
-calls = [
-    'boolean',
-    'integer',
-    'number',
-    'string',
-    'me',
-]
-
-# @contextmanager
-# def _profile():
-#     try:
-#         import cProfile
-#         prof = cProfile.Profile()
-#         prof.enable()
-#         yield
-#     finally:
-#         prof.disable()
-#         prof.print_stats(sort='cumtime')
-
-
-@contextmanager
-def _profile():
+def quantile(xs, q):
+    '''`xs` should be sorted.'''
+    return xs[min(int(q * len(xs)), len(xs) - 1)] if xs else None
+
+def summarize(ts, **kw):
+    ts = sorted(ts)
+    total = sum(ts)
+    return dict({
+        'p50': quantile(ts, 0.5), 'p99': quantile(ts, 0.99), 'mean': total / len(ts),
+        'ops_per_s': len(ts) / total if total else None,
+    }, **kw)
+
+def timings(func, n, warmup=None):
+    '''Time each call of `func()`.'''
+    for _ in range(n // 10 if warmup is None else warmup):
+        func()
+    ts = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        func()
+        ts.append(time.perf_counter() - t0)
+    return ts
+
+def n_fds():
     try:
-        import pyinstrument
-        prof = pyinstrument.Profiler()
-        prof.start()
-        yield
-    finally:
-        prof.stop()
-        print(prof.output_text(unicode=True, color=True, show_all=True))
-
-
-def _profile_func(func):
-    def inner(*a, catch=None, **kw):
-        with catch:
-            with _profile():
-                print('profiling', func.__name__, a, kw)
-                return func(*a, **kw)
-    return inner
-
-
-remoteobj.util._run_remote = _profile_func(remoteobj.util._run_remote)
-
-def run_test(obj, calls, n=100):
-    catch = remoteobj.Except()
-    for obj in objs:
-        print(obj.remote.__class__.__name__)
-        with remoteobj.util.dummy_listener(obj, catch=catch):
-            with _profile():
-                for _ in range(n):
-                    for k in calls:
-                        yield obj, k
-        catch.raise_any()
-
-
-
-
-objs = [
-    Obj(simple.PipeProxy),
-    Obj(simple.QueueProxy),
-    Obj(simple.SimpleQueueProxy),
-    # Obj(simple.ManagerQueueProxy),
-    # Obj(simple.DictQueueProxy),
-]
-
-# calls_ = [k.split('.')[-1].strip('()') for k in calls]
-for obj, k in run_test(objs, calls):
-    _ = obj.remote.remote(k)
-    # print(k, _, getattr(obj, k)())
-    assert _ == getattr(obj, k)() or _ == obj.remote
-    # print(k, timeit.timeit('obj.remote.remote("{}")'.format(k), number=1, globals=globals()))
-
-
-
-objs = [
-    Obj(remoteobj.Proxy),
-    # Obj(reip.util.remote.RemoteProxy),
-]
-
-for obj, k in run_test(objs, calls):
-    # _ = eval(k, globals())
-    _ = getattr(obj.remote, k)()
-    assert _ == getattr(obj, k)() or _ == obj.remote
-    # print(k, _)
-    # cProfile.runctx('obj.remote.{}()'.format(k), globals(), locals())
-    # print(k, timeit.timeit('obj.remote.{}()'.format(k), number=1, globals=globals()))
+        return len(os.listdir('/proc/self/fd'))
+    except FileNotFoundError:  # not linux
+        return -1
+
+def _noop():
+    pass
+
+
+# proxies
+
+@benchmark
+def bench_roundtrip(n):
+    '''Round trip latency for the different kinds of requests.'''
+    results = {}
+    for suffix, metrics, use_codec in [('', False, True), ('+metrics', True, True), ('+pickle', False, False)]:
+        remoteobj.codec.ENABLED = use_codec  # the listener inherits this when it forks
+        obj = Obj(metrics=metrics)
+        with remoteobj.util.listener(obj):
+            cases = {
+                'get_': lambda: obj.remote.value.get_(),
+                'call': lambda: obj.remote.integer(),
+                'call_str': lambda: obj.remote.string(),
+                'setattr': lambda: setattr(obj.remote, 'value', 6),
+                'chain': lambda: obj.remote.me(),
+            }
+            for name, func in cases.items():
+                results[name + suffix] = summarize(timings(func, n))
+    remoteobj.codec.ENABLED = True
+    return results
+
+
+@benchmark
+def bench_payload(n):
+    '''Round trip latency for a bytes payload sent to the listener and back.'''
+    obj = Obj()
+    results = {}
+    with remoteobj.util.listener(obj):
+        for size in [16, 1024, 64 * 1024, 1024 * 1024]:
+            x = b'x' * size
+            ts = timings(lambda: obj.remote.echo(x), max(10, n * 16 // size if size > 1024 * 16 else n))
+            s = summarize(ts)
+            s['mb_per_s'] = 2 * size * s.pop('ops_per_s') / 1e6
+            results[str(size)] = s
+    return results
+
+
+def _client(obj, barrier, n):
+    barrier.wait()
+    return timings(lambda: obj.remote.integer(), n, warmup=0)
+
+@benchmark
+def bench_clients(n):
+    '''Throughput and latency with many client processes calling one listener.'''
+    obj = Obj()
+    results = {}
+    with remoteobj.util.listener(obj):
+        for n_clients in [1, 2, 4, 8]:
+            barrier = mp.Barrier(n_clients + 1)
+            procs = [remoteobj.util.process(_client, obj, barrier, n).start() for _ in range(n_clients)]
+            barrier.wait()
+            t0 = time.perf_counter()
+            remoteobj.util.join_all(procs)
+            dt = time.perf_counter() - t0
+            s = summarize([t for p in procs for t in p.result])
+            s['ops_per_s'] = n_clients * n / dt
+            results[str(n_clients)] = s
+    return results
+
+
+def _run_simple(obj, event):
+    with obj.remote:
+        while not event.is_set():
+            obj.remote.poll()
+
+def _no_proxy(obj):
+    return None
+
+class _Manager(mp.managers.BaseManager):
+    pass
+_Manager.register('Obj', Obj)
+
+@benchmark
+def bench_transports(n):
+    '''remoteobj.Proxy vs the transports in tests/simple.py vs multiprocessing.managers.'''
+    results = {}
+    for cls in [simple.PipeProxy, simple.QueueProxy, simple.SimpleQueueProxy]:
+        obj = Obj(cls)
+        event = mp.Event()
+        with remoteobj.util.process(_run_simple, obj, event):
+            while not obj.remote.listening:
+                time.sleep(1e-4)
+            results[cls.__name__] = summarize(timings(lambda: obj.remote.remote('integer'), n))
+            event.set()
+
+    obj = Obj()
+    with remoteobj.util.listener(obj):
+        results['Proxy'] = summarize(timings(lambda: obj.remote.integer(), n))
+
+    obj = Obj(thread_affine=True)  # a listener thread in this process
+    with obj.remote.listen_(bg=True):
+        obj.remote.wait_until_listening()
+        results['Proxy(thread_affine)'] = summarize(timings(lambda: obj.remote.integer(), n))
+
+    with _Manager() as manager:
+        mobj = manager.Obj(proxycls=_no_proxy)
+        results['managers'] = summarize(timings(lambda: mobj.integer(), n))
+    return results
+
+
+# exceptions and processes
+
+@benchmark
+def bench_except(n):
+    '''Creating Except objects and sending exceptions/results through them.'''
+    results = {}
+    for name, kw, count in [('create', {}, n * 10), ('create_dedicated', {'manager': mp}, min(n, 500))]:
+        gc.collect()
+        fds = n_fds()
+        t0 = time.perf_counter()
+        excs = [remoteobj.Except(**kw) for _ in range(count)]
+        dt = time.perf_counter() - t0
+        fds_after = n_fds()
+        del excs
+        gc.collect()
+        results[name] = {
+            'mean': dt / count, 'ops_per_s': count / dt, 'fds': fds_after - fds,
+            'registered_after_gc': len(remoteobj.Except._Except__excs)}
+
+    exc = remoteobj.Except(max_per_group=10)
+    t0 = time.perf_counter()
+    remoteobj.util.process(_raise_many, exc, n * 10).start().join()
+    dt = time.perf_counter() - t0
+    assert exc.stats()['_raise_many']['count'] == n * 10, exc.stats()
+    results['set'] = {'mean': dt / (n * 10), 'ops_per_s': n * 10 / dt}
+
+    t0 = time.perf_counter()
+    with remoteobj.util.process(_yield_many, n * 100) as p:
+        pass
+    assert sum(1 for _ in p.result) == n * 100
+    dt = time.perf_counter() - t0
+    results['yield'] = {'mean': dt / (n * 100), 'ops_per_s': n * 100 / dt}
+    return results
+
+def _raise_many(exc, n):
+    for i in range(n):
+        exc.set(KeyError(i), '_raise_many')
+
+def _yield_many(n):
+    yield from range(n)
+
+
+@benchmark
+def bench_jobs(n):
+    '''Starting and joining processes, threads, and pool jobs.'''
+    results = {}
+    for name, cls in [('process', remoteobj.util.process), ('thread', remoteobj.util.thread)]:
+        gc.collect()
+        fds = n_fds()
+        ts = timings(lambda: cls(_noop).start().join(), max(n // 10, 10), warmup=2)
+        gc.collect()
+        results[name] = summarize(ts, fds=n_fds() - fds)
+
+    with remoteobj.util.pool(2) as pool:
+        results['pool'] = summarize(timings(lambda: pool.submit(_noop).join(), n))
+    return results
+
+
+# imports
+
+IMPORTS = {
+    'remoteobj': 'import remoteobj',
+    'Proxy': 'import remoteobj; remoteobj.Proxy',
+    'Except': 'import remoteobj; remoteobj.Except',
+    'util': 'import remoteobj; remoteobj.util',
+}
+
+def _import_time(stmt):
+    '''Time an import in a fresh interpreter.'''
+    code = 'import time; t0 = time.perf_counter(); {}; print(time.perf_counter() - t0)'.format(stmt)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    return float(out.stdout)
+
+@benchmark
+def bench_imports(n):
+    '''How long it takes to import remoteobj (and use parts of it) in a new process.'''
+    results = {}
+    for name, stmt in IMPORTS.items():
+        results[name] = s = summarize([_import_time(stmt) for _ in range(max(n // 100, 5))])
+        del s['ops_per_s']
+    return results
+
+
+# running and comparing
+
+def run(names, n):
+    return {
+        'meta': {
+            'time': time.time(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'start_method': mp.get_start_method(), 'n': n,
+        },
+        'results': {name: BENCHMARKS[name](n) for name in names},
+    }
+
+
+def flatten(results):
+    return {
+        '{}.{}.{}'.format(bench, case, metric): value
+        for bench, cases in results['results'].items()
+        for case, metrics in cases.items()
+        for metric, value in metrics.items()
+        if isinstance(value, (int, float))
+    }
+
+
+COUNT_METRICS = ('fds', 'registered_after_gc')  # leaks, so any increase counts
+
+def compare(old, new, threshold=0.2):
+    '''Compare two runs. Returns the metrics that got worse by more than
+    `threshold` (as a fraction) as `[(name, old, new, change)]`. Count metrics
+    are compared exactly and their change is the difference instead.'''
+    old, new = flatten(old), flatten(new)
+    worse = []
+    for name in sorted(set(old) & set(new)):
+        a, b = old[name], new[name]
+        if name.rsplit('.', 1)[-1] in COUNT_METRICS:
+            if b > a:
+                worse.append((name, a, b, b - a))
+            continue
+        if not a or not b:  # no ratio
+            continue
+        change = b / a - 1
+        if name.endswith('_per_s'):
+            change = a / b - 1  # higher is better, so flip it
+        if change > threshold:
+            worse.append((name, a, b, change))
+    return worse
+
+
+def print_results(results):
+    for bench, cases in results['results'].items():
+        print(bench)
+        for case, metrics in cases.items():
+            print('  {:<22} {}'.format(case, '  '.join(
+                '{}={}'.format(k, _fmt(v)) for k, v in metrics.items())))
+
+def _fmt(v):
+    if isinstance(v, float):
+        return '{:.3g}'.format(v)
+    return str(v)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help='benchmarks to run: {}'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('-n', type=int, default=None, help='the number of requests for each case')
+    parser.add_argument('--quick', action='store_true', help='use a smaller n')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs='+', metavar='JSON',
+                        help='a baseline to compare against (and optionally the results to compare, instead of running)')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='how much worse a metric can get before it counts as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 1:
+        with open(args.compare[1]) as f:
+            results = json.load(f)
+    else:
+        n = args.n or (200 if args.quick else 2000)
+        names = args.names or list(BENCHMARKS)
+        results = run(names, n)
+        print_results(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        worse = compare(baseline, results, args.threshold)
+        for name, a, b, change in worse:
+            print('REGRESSION {}: {} -> {} ({})'.format(
+                name, _fmt(a), _fmt(b), '{:+}'.format(change) if name.rsplit('.', 1)[-1] in COUNT_METRICS
+                else '{:+.0%}'.format(change)))
+        print('{} regressions (threshold {:.0%})'.format(len(worse), args.threshold))
+        sys.exit(1 if worse else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+'''Soak and capacity tests for a Proxy listener.
+
+Client processes call one listener as fast as they can with a mix of
+requests. The number of clients ramps up in stages until the latency or
+error SLO breaks. Every `--interval` seconds, it records throughput,
+latency, and the listener's and this process's memory (RSS), open file
+descriptors, and `Except` registries so you can spot leaks.
+
+    # find where the listener saturates
+    PYTHONPATH=. python tests/soak.py --clients 1,2,4,8,16,32 --stage-time 10 --slo-p99 0.005
+
+    # leave it running for an hour and watch for leaks
+    PYTHONPATH=. python tests/soak.py --clients 8 --stage-time 3600 -o soak.json
+
+    # a different request mix (weights) with bigger payloads
+    PYTHONPATH=. python tests/soak.py --mix get=2,call=2,set=1,echo=4,raise=1 --payload 65536
+'''
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import resource
+import multiprocessing as mp
+import remoteobj
+from remoteobj.metrics import Histogram
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmark import quantile, n_fds
+
+
+class Obj:
+    value = 5
+    def __init__(self, **kw):
+        self.remote = remoteobj.Proxy(self, **kw)
+
+    def integer(self):
+        return 5
+
+    def echo(self, x):
+        return x
+
+    def fail(self):
+        raise ValueError('expected')
+
+    def resources(self):
+        return resources()
+
+
+def resources():
+    '''Memory, file descriptors, and `Except` registry sizes for this process.'''
+    return {
+        'rss': rss(), 'fds': n_fds(),
+        'except_queues': len(remoteobj.Except._Except__Qs),
+        'except_objects': len(remoteobj.Except._Except__excs),
+    }
+
+
+def rss():
+    '''The current resident set size in bytes (the peak, if not on linux).'''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+# clients
+
+MIX_OPS = ('get', 'call', 'set', 'echo', 'raise')
+
+def parse_mix(mix):
+    '''`'get=4,call=4,set=1'` -> `{'get': 4.0, 'call': 4.0, 'set': 1.0}`'''
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in MIX_OPS:
+            raise ValueError('Unknown request type {!r}. Expected one of {}'.format(name, MIX_OPS))
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def _requests(obj, payload):
+    x = b'x' * payload
+    def set_():
+        obj.remote.value = 6
+    def raise_():
+        try:
+            obj.remote.fail()
+        except ValueError:
+            pass
+    return {
+        'get': lambda: obj.remote.value.get_(),
+        'call': lambda: obj.remote.integer(),
+        'set': set_,
+        'echo': lambda: obj.remote.echo(x),
+        'raise': raise_,
+    }
+
+
+def _client(obj, mix, payload, stop, reports, interval, seed):
+    requests = _requests(obj, payload)
+    names, weights = list(mix), list(mix.values())
+    rand = random.Random(seed)
+    ts, errors, timeouts = [], 0, 0
+    next_report = time.time() + interval
+    while not stop.is_set():
+        func = requests[rand.choices(names, weights)[0]]
+        t0 = time.perf_counter()
+        try:
+            func()
+        except TimeoutError:
+            timeouts += 1
+        except Exception:
+            errors += 1
+        ts.append(time.perf_counter() - t0)
+        if time.time() >= next_report:
+            reports.put((ts, errors, timeouts))
+            ts, errors, timeouts = [], 0, 0
+            next_report += interval
+    reports.cancel_join_thread()  # don't block on exit if nobody reads the last report
+
+
+# running
+
+def soak(clients=(1, 2, 4, 8), stage_time=10, interval=1, mix='get=4,call=4,set=1,echo=1',
+         payload=1024, slo_p99=0.005, slo_errors=0.001, keep_going=False, **kw):
+    '''Ramp up the number of clients in stages and record what happens.
+
+    Arguments:
+        clients (list): the number of clients for each stage.
+        stage_time (float): how long each stage runs for.
+        interval (float): how often to take a sample.
+        mix (str): the request weights, e.g. `'get=4,call=4,set=1,echo=1,raise=0'`.
+        payload (int): the size of the `echo` payload in bytes.
+        slo_p99 (float): the p99 latency (seconds) that counts as broken.
+        slo_errors (float): the fraction of errors and timeouts that counts as broken.
+        keep_going (bool): keep ramping after the SLO breaks.
+        **kw: passed to `Proxy`, e.g. `timeout=1`.
+    '''
+    mix = parse_mix(mix) if isinstance(mix, str) else mix
+    obj = Obj(**kw)
+    reports = mp.Queue()
+    stops, procs = [], []
+    samples, stages = [], []
+    t_start = time.time()
+    with remoteobj.util.listener(obj):
+        try:
+            for n_clients in clients:
+                while len(procs) < n_clients:
+                    stop = mp.Event()
+                    stops.append(stop)
+                    procs.append(remoteobj.util.process(
+                        _client, obj, mix, payload, stop, reports, interval, len(procs)).start())
+
+                hist, stage_errors = Histogram(), 0
+                t0 = time.time()
+                next_sample = t0 + interval
+                while next_sample <= t0 + stage_time + 1e-6:
+                    time.sleep(max(0, next_sample - time.time()))
+                    ts, errors, timeouts = _drain(reports)
+                    for t in ts:
+                        hist.add(t)
+                    stage_errors += errors + timeouts
+                    ts.sort()
+                    sample = {
+                        'time': time.time() - t_start, 'clients': n_clients,
+                        'ops_per_s': len(ts) / interval, 'p50': quantile(ts, 0.5),
+                        'p99': quantile(ts, 0.99), 'errors': errors, 'timeouts': timeouts,
+                        'listener': obj.remote.resources(),
+                        'local': resources(),
+                    }
+                    samples.append(sample)
+                    _print_sample(sample)
+                    next_sample += interval
+
+                stage = {
+                    'clients': n_clients, 'requests': hist.count,
+                    'ops_per_s': hist.count / (time.time() - t0),
+                    'p50': hist.quantile(0.5), 'p99': hist.quantile(0.99), 'max': hist.max,
+                    'error_rate': stage_errors / hist.count if hist.count else None,
+                }
+                stage['slo_ok'] = bool(
+                    hist.count and stage['p99'] <= slo_p99 and stage['error_rate'] <= slo_errors)
+                stages.append(stage)
+                print('-- {clients} clients: {requests} requests, {ops_per_s:.0f}/s, p50={p50} p99={p99} '
+                      'errors={error_rate:.2%} {}'.format('ok' if stage['slo_ok'] else 'SLO BROKEN', **stage))
+                if not stage['slo_ok'] and not keep_going:
+                    break
+        finally:
+            for stop in stops:
+                stop.set()
+            remoteobj.util.join_all(procs)
+
+    return {
+        'meta': {
+            'time': t_start, 'mix': mix, 'payload': payload, 'stage_time': stage_time,
+            'interval': interval, 'slo_p99': slo_p99, 'slo_errors': slo_errors,
+        },
+        'samples': samples,
+        'stages': stages,
+        'summary': summarize(samples, stages),
+    }
+
+
+def _drain(reports):
+    ts, errors, timeouts = [], 0, 0
+    while True:
+        try:
+            ts_, errors_, timeouts_ = reports.get_nowait()
+        except queue.Empty:
+            return ts, errors, timeouts
+        ts.extend(ts_)
+        errors += errors_
+        timeouts += timeouts_
+
+
+def summarize(samples, stages):
+    ok = [s for s in stages if s['slo_ok']]
+    peak = max(stages, key=lambda s: s['ops_per_s'], default=None)
+    # compare samples with the same number of clients so the ramp doesn't count as a leak
+    steady = [s for s in samples if stages and s['clients'] == stages[-1]['clients']]
+    growth = {
+        side: {k: steady[-1][side][k] - steady[0][side][k] for k in steady[0][side]}
+        for side in ('listener', 'local')} if steady else {}
+    return {
+        'requests': sum(s['requests'] for s in stages),
+        'max_clients_within_slo': ok[-1]['clients'] if ok else None,
+        'peak_ops_per_s': peak and peak['ops_per_s'],
+        'peak_clients': peak and peak['clients'],
+        'growth': growth,  # over the last stage, e.g. {'listener': {'rss': ..., 'fds': ...}}
+    }
+
+
+def _print_sample(s):
+    print('{time:7.1f}s {clients:>3} clients {ops_per_s:>8.0f}/s p50={p50:.2e} p99={p99:.2e} '
+          'errors={errors} timeouts={timeouts} | listener rss={l[rss]} fds={l[fds]} '
+          'Qs={l[except_queues]} excs={l[except_objects]} | local rss={m[rss]} fds={m[fds]} '
+          'Qs={m[except_queues]} excs={m[except_objects]}'.format(
+            l=s['listener'], m=s['local'], **dict(s, p50=s['p50'] or 0, p99=s['p99'] or 0)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', default='1,2,4,8', help='the number of clients for each stage')
+    parser.add_argument('--stage-time', type=float, default=10, help='seconds per stage')
+    parser.add_argument('--interval', type=float, default=1, help='seconds between samples')
+    parser.add_argument('--mix', default='get=4,call=4,set=1,echo=1',
+                        help='request weights ({})'.format(', '.join(MIX_OPS)))
+    parser.add_argument('--payload', type=int, default=1024, help='echo payload size in bytes')
+    parser.add_argument('--slo-p99', type=float, default=0.005, help='p99 latency SLO in seconds')
+    parser.add_argument('--slo-errors', type=float, default=0.001, help='error and timeout rate SLO')
+    parser.add_argument('--keep-going', action='store_true', help="don't stop when the SLO breaks")
+    parser.add_argument('--timeout', type=float, default=None, help='the proxy request timeout')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = soak(
+        clients=[int(n) for n in args.clients.split(',')], stage_time=args.stage_time,
+        interval=args.interval, mix=args.mix, payload=args.payload, slo_p99=args.slo_p99,
+        slo_errors=args.slo_errors, keep_going=args.keep_going, timeout=args.timeout)
+    print(json.dumps(results['summary'], indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import pickle
+import remoteobj
+from remoteobj import codec
+import pytest
+
+
+NO_ARGS = ((), {})
+
+@pytest.mark.parametrize("msg", [
+    ((123, 1), None, (('.', 'x'),)),
+    ((123, 2), 1600000000.5, (('.', 'data'), ('[]', 'a'))),
+    ((123, 3), None, (('.', 'inc'), ('()', NO_ARGS))),
+    ((123, 4), None, (('[]', 5), ('[]', -1.5), ('[]', None), ('[]', True), ('[]', b'k'))),
+    ((123, 5), None, ()),
+    ((123, 6), (5, None)),
+    ((123, 7), (None, None)),
+    ((123, 8), (False, None)),
+    ((123, 9), (2**63 - 1, None)),
+    ((123, 10), ('héllo', None)),
+    ((123, 11), (b'\x00\x01', None)),
+])
+def test_encoded(msg):
+    buf = codec.dumps(msg)
+    assert buf[:1] != pickle.PROTO  # not pickled
+    x = codec.loads(buf)
+    assert x == msg
+    assert [type(v) for v in _flatten(x)] == [type(v) for v in _flatten(msg)]
+
+
+@pytest.mark.parametrize("msg", [
+    ((123, 1), None, (('()', ((1,), {})),)),  # arguments
+    ((123, 2), None, (('()', ((), {'a': 1})),)),
+    ((123, 3), None, (('.=', ('x', 5)),)),
+    ((123, 4), None, (('[]', (1, 2)),)),  # tuple key
+    ((123, 5), None, remoteobj.base._Control('listener_stats')),
+    ((123, 6), (2**64, None)),  # too big
+    ((123, 7), ([1, 2], None)),
+    ((123, 8), (None, KeyError('x'))),
+    ((123, 9), None),  # cancelled
+    ((123, 10), ('x' * (codec.MAX_SIZE + 1), None)),
+    ((123, 11), (1, None), 'extra', 'stuff'),
+])
+def test_pickled(msg):
+    buf = codec.dumps(msg)
+    assert buf[:1] == pickle.PROTO
+    x = codec.loads(buf)
+    assert type(x) == type(msg) and len(x) == len(msg)
+
+
+def test_disabled(monkeypatch):
+    msg = ((123, 1), (5, None))
+    monkeypatch.setattr(codec, 'ENABLED', False)
+    assert codec.dumps(msg)[:1] == pickle.PROTO
+    assert codec.loads(codec.dumps(msg)) == msg
+
+
+def _flatten(x):
+    if isinstance(x, (tuple, list)):
+        return [y for xi in x for y in _flatten(xi)]
+    if isinstance(x, dict):
+        return _flatten(list(x.items()))
+    return [x]
@@ -213,6 +213,46 @@ def test_wait_until_listening_fail():
             print('listening', obj.remote.wait_until_listening(p))
 
 
+def _listen_after(obj, delay, t=0.5):
+    time.sleep(delay)
+    with obj.remote:
+        t0 = time.time()
+        while time.time() - t0 < t:
+            obj.remote.poll()
+            time.sleep(1e-4)
+
+def test_wait_until_listening_many():
+    objs = [ObjectB() for _ in range(6)]
+    procs = [u.process(_listen_after, o, 0.05 * i).start() for i, o in enumerate(objs)]
+    t0 = time.time()
+    assert u.wait_until_listening([o.remote for o in objs], procs, timeout=10)
+    assert time.time() - t0 < 0.5  # waits for the slowest, not the sum
+    assert [o.remote.x.get_() for o in objs] == [10] * 6
+    for p in procs:
+        p.join()
+    assert not any(o.remote.listening_ for o in objs)
+
+    objs = [ObjectB(), ObjectB()]
+    procs = [u.process(_listen_after, objs[0], 0).start(), u.process(_exit_early, objs[1]).start()]
+    with pytest.raises(RuntimeError):
+        u.wait_until_listening([o.remote for o in objs], procs, timeout=10)
+    for p in procs:
+        p.join()
+
+def test_wait_until_listening_timeout():
+    obj = ObjectB()
+    t0 = time.time()
+    with pytest.raises(TimeoutError):
+        obj.remote.wait_until_listening(timeout=0.1)
+    assert time.time() - t0 < 1
+
+def test_listeners():
+    objs = [ObjectB() for _ in range(4)]
+    with u.listeners(objs) as procs:
+        assert len(procs) == 4
+        assert [o.remote.inc() for o in objs] == [11] * 4
+
+
 def test_fulfill_final():
     obj = ObjectB()
     t0 = time.time()
@@ -332,3 +372,526 @@ def test_dueling_threads():
         assert c3.value > 0
 
         obj.catch_.raise_any()
+
+
+class Slow:
+    def __init__(self):
+        self.remote = remoteobj.Proxy(self)
+
+    def work(self, t):
+        time.sleep(t)
+        return t
+
+def _flood(obj, n, t):
+    import threading
+    ts = [threading.Thread(target=obj.remote.work, args=(t,)) for _ in range(n)]
+    for th in ts:
+        th.start()
+    for th in ts:
+        th.join()
+
+def test_process_requests_budget():
+    obj = Slow()
+    with obj.remote:
+        with u.process(_flood, obj, 10, 0.005) as p:
+            t0 = time.time()
+            while obj.remote.pending_requests() < 10 and time.time() - t0 < 5:
+                time.sleep(1e-3)
+            assert obj.remote.pending_requests() == 10
+
+            t0 = time.time()
+            left = obj.remote.process_requests(max_time=0.012)
+            assert time.time() - t0 < 0.05
+            assert 0 < left < 10
+
+            assert obj.remote.process_requests(max_n=2) == left - 2
+
+            while obj.remote.process_requests():
+                pass
+            p.join()
+            assert obj.remote.pending_requests() == 0
+
+def test_listener_budget():
+    obj = ObjectB()
+    with remoteobj.util.listener(obj, max_time=0.002, max_n=5, wait_timeout=10):
+        assert obj.remote.inc() == 11
+        assert obj.remote.x.get_() == 11
+
+def _step(obj):
+    obj.steps += 1
+
+def test_listener_budget_callback():
+    obj = ObjectB()
+    obj.steps = 0
+    with remoteobj.util.listener(obj, callback=_step, max_time=0.002, max_n=5, wait_timeout=10):
+        assert obj.remote.inc() == 11
+        t0 = time.time()
+        while not obj.remote.steps.get_() and time.time() - t0 < 5:
+            time.sleep(1e-3)
+        assert obj.remote.steps.get_() > 0
+
+
+def test_timeout():
+    obj = Slow()
+    with remoteobj.util.listener(obj, wait_timeout=10):
+        t0 = time.time()
+        with pytest.raises(TimeoutError):
+            obj.remote.work(0.5, _timeout=0.1)
+        assert time.time() - t0 < 0.3
+        # the late response is thrown away instead of going to the next caller
+        assert obj.remote.work(0.01) == 0.01
+        assert obj.remote.work(0.02, _timeout=1) == 0.02
+
+        # waiting for another caller counts too
+        import threading
+        th = threading.Thread(target=obj.remote.work, args=(0.5,))
+        th.start()
+        time.sleep(0.05)
+        t0 = time.time()
+        with pytest.raises(TimeoutError):
+            obj.remote.work(0.01, _timeout=0.1)
+        assert time.time() - t0 < 0.3
+        th.join()
+
+    obj = Slow()
+    obj.remote = remoteobj.Proxy(obj, timeout=0.1)
+    with remoteobj.util.listener(obj, wait_timeout=10):
+        with pytest.raises(TimeoutError):
+            obj.remote.work(0.3)
+        assert obj.remote.work(0.2, _timeout=None) == 0.2
+
+
+def _call_inc(obj, timeout):
+    try:
+        return obj.remote.inc(_timeout=timeout)
+    except TimeoutError:
+        return 'timeout'
+
+def test_expired_requests_skipped():
+    obj = ObjectB()
+    with obj.remote:
+        with u.process(_call_inc, obj, 0.05) as p:
+            time.sleep(0.2)  # let the request expire
+            assert obj.remote.process_requests() == 0
+        assert p.result == 'timeout'
+        assert obj.x == 10  # never ran
+
+
+def _flood_limited(obj, n):
+    import threading
+    out = []
+    def call():
+        try:
+            out.append(obj.remote.work(0))
+        except remoteobj.ListenerOverloaded:
+            out.append('overloaded')
+    ts = []
+    for _ in range(n):
+        ts.append(threading.Thread(target=call))
+        ts[-1].start()
+        time.sleep(0.02)
+    for th in ts:
+        th.join()
+    return sorted(out, key=str)
+
+def test_max_pending():
+    obj = Slow()
+    obj.remote = remoteobj.Proxy(obj, max_pending=2)
+    with obj.remote:
+        with u.process(_flood_limited, obj, 5) as p:
+            time.sleep(0.3)
+            assert obj.remote.pending_requests() == 3  # 1 sent + 2 waiting
+            while p.is_alive():
+                obj.remote.process_requests()
+                time.sleep(1e-3)
+        assert p.result == [0, 0, 0, 'overloaded', 'overloaded']
+
+def test_killed_caller():
+    '''A caller that's killed while it's waiting on the lock doesn't stay pending.'''
+    import os, signal
+    obj = Slow()
+    obj.remote = remoteobj.Proxy(obj, max_pending=1)
+    with obj.remote:
+        obj.remote._llock.acquire()  # hold up the caller
+        p = u.process(obj.remote.work, 0).start()
+        t0 = time.time()
+        while obj.remote.pending_requests() < 1 and time.time() - t0 < 5:
+            time.sleep(1e-3)
+        os.kill(p.pid, signal.SIGKILL)
+        p.join(raises=False)
+        obj.remote._llock.release()
+        assert obj.remote.pending_requests() == 1  # it couldn't give back its slot
+
+        # it's dropped instead of making the listener wait on it
+        assert obj.remote.process_requests() == 0
+        assert obj.remote.pending_requests() == 0
+        with u.process(obj.remote.work, 0) as p:  # there's room again
+            while p.is_alive():
+                obj.remote.process_requests()
+                time.sleep(1e-3)
+        assert p.result == 0
+
+
+class Dies(ObjectA):
+    def die(self):
+        import os, signal
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    def work(self, t):
+        time.sleep(t)
+        return t
+
+def test_listener_stale_heartbeat(monkeypatch):
+    '''Where we can't check the process, a stale heartbeat only fails the
+    call that's waiting. The listener could just be busy.'''
+    monkeypatch.setattr(remoteobj.base, 'pid_alive', lambda pid: None)
+    obj = Dies(heartbeat_timeout=0.5)
+    with remoteobj.util.listener(obj, wait_timeout=10):
+        time.sleep(0.7)
+        assert obj.remote.x.get_() == 10  # idle, but its heartbeat keeps it alive
+        t0 = time.time()
+        with pytest.raises(TimeoutError, match='heartbeat'):
+            obj.remote.work(1.5)
+        assert 0.4 < time.time() - t0 < 1.4
+        assert obj.remote.listening_  # still listening for everyone else
+        time.sleep(1)  # let it finish
+        assert obj.remote.x.get_() == 10
+
+
+def test_listener_dies():
+    obj = Dies()
+    with remoteobj.util.listener(obj, wait_timeout=10) as p:
+        assert obj.remote.heartbeat_ < 1
+        t0 = time.time()
+        with pytest.raises(RuntimeError, match='died'):
+            obj.remote.die()
+        assert time.time() - t0 < 0.5
+        assert not obj.remote.listening_
+        assert obj.remote.heartbeat_ is None
+        # new calls fail right away, or return the default
+        assert obj.remote.x.get_(default=5) == 5
+        with pytest.raises(RuntimeError):
+            obj.remote.x.get_()
+
+def test_listener_dies_waiting():
+    # a caller that's waiting on the lock when the listener dies shouldn't hang either
+    import threading
+    obj = Dies()
+    with remoteobj.util.listener(obj, wait_timeout=10) as p:
+        out = []
+        th = threading.Thread(target=lambda: out.append(obj.remote.x.get_(default='default')))
+        with obj.remote._llock:  # pretend someone else is using it
+            th.start()
+            time.sleep(0.05)
+            p.terminate()
+            p.join(raises=False)
+        th.join(1)
+        assert out == ['default']
+
+
+def _flood_default(obj, n, t):
+    import threading
+    out = []
+    ts = [threading.Thread(target=lambda: out.append(obj.remote.work(t, _default='cancelled')))
+          for _ in range(n)]
+    for th in ts:
+        th.start()
+    for th in ts:
+        th.join()
+    return sorted(out, key=str)
+
+@pytest.mark.parametrize("fulfill_final,drain_timeout,expected", [
+    # the request that was already sent is handled. The rest see that we stopped.
+    (True, 1, [0.02] + ['cancelled'] * 4),
+    (False, 1, ['cancelled'] * 5),
+    (True, 0, ['cancelled'] * 5),
+])
+def test_stop_drain(fulfill_final, drain_timeout, expected):
+    obj = Slow()
+    obj.remote = remoteobj.Proxy(obj, fulfill_final=fulfill_final, drain_timeout=drain_timeout)
+    obj.remote.listening_ = True
+    with u.process(_flood_default, obj, 5, 0.02) as p:
+        t0 = time.time()
+        while obj.remote.pending_requests() < 5 and time.time() - t0 < 5:
+            time.sleep(1e-3)
+        t0 = time.time()
+        obj.remote.listening_ = False
+        assert time.time() - t0 < drain_timeout + 0.1
+    assert p.result == expected
+    assert obj.remote.pending_requests() == 0
+
+
+def test_metrics():
+    obj = ObjectB(metrics=True)
+    with remoteobj.util.listener(obj, wait_timeout=10):
+        assert obj.remote.inc() == 11
+        assert obj.remote.x.get_() == 11
+        assert obj.remote.data['a'].get_() == 5
+        with pytest.raises(KeyError):
+            obj.remote.error()
+
+        s = obj.remote.stats_()
+        assert s['side'] == 'caller'
+        assert {k: v['count'] for k, v in s['calls'].items()} == {
+            '?.inc()': 1, '?.x': 1, "?.data[]": 1, '?.error()': 1}
+        assert s['errors'] == 1
+        assert s['latency']['count'] == s['lock_wait']['count'] == 4
+        assert s['request_bytes']['count'] == s['response_bytes']['count'] == 4
+        assert 0 < s['latency']['p50'] <= s['latency']['max']
+        assert s['pending'] == 0
+
+        ls = obj.remote.listener_stats_()
+        assert ls['side'] == 'listener'
+        assert ls['calls']['?.inc()']['count'] == 1
+        assert ls['latency']['count'] == 4 and ls['errors'] == 1
+
+        text = obj.remote.stats_(format='prometheus', reset=True)
+        assert 'remoteobj_calls_total{side="caller",view="?.inc()"} 1\n' in text
+        assert 'remoteobj_latency_seconds_count{side="caller"} 5\n' in text  # + listener_stats_
+        assert 'remoteobj_latency_seconds_bucket{side="caller",le="+Inf"} 5\n' in text
+        assert obj.remote.stats_()['latency']['count'] == 0
+
+    with pytest.raises(RuntimeError):
+        ObjectB().remote.stats_()
+    assert ObjectB(metrics=True).remote.listener_stats_() is None  # not listening
+
+
+def test_histogram():
+    from remoteobj.metrics import Histogram
+    h = Histogram([1, 2, 5])
+    for x in [0.5, 1, 1.5, 3, 10]:
+        h.add(x)
+    assert h.cumulative() == [(1, 2), (2, 3), (5, 4), ('+Inf', 5)]
+    assert h.quantile(0.5) == 2
+    assert h.quantile(1) == 10
+    assert h.as_dict()['mean'] == 16 / 5
+
+
+def test_hooks():
+    q = mp.Queue()
+    def hook(info):
+        q.put((info['hook'], info['rid'], info['shape'], info.get('status'),
+               info['size'] > 0, str(info['view'])))
+    for name in remoteobj.hooks.HOOK_NAMES:
+        remoteobj.add_hook(name, hook)
+    try:
+        obj = ObjectB()
+        with remoteobj.util.listener(obj, wait_timeout=10):
+            assert obj.remote.inc() == 11
+            with pytest.raises(KeyError):
+                obj.remote.error()
+    finally:
+        for name in remoteobj.hooks.HOOK_NAMES:
+            remoteobj.remove_hook(name, hook)
+
+    events = [q.get(timeout=1) for _ in range(8)]
+    by_rid = {}
+    for hook_name, rid, shape, status, has_size, view in events:
+        by_rid.setdefault(rid, {})[hook_name] = (shape, status, has_size, view)
+    assert len(by_rid) == 2  # caller and listener agree on the request ids
+    inc, error = sorted(by_rid.values(), key=lambda d: d['before_send'][0])[::-1]
+    assert inc['before_send'] == ('?.inc()', None, True, '(?.inc())')
+    assert inc['before_process'] == ('?.inc()', None, True, '(?.inc())')
+    assert inc['after_process'][1] == inc['after_recv'][1] == 'ok'
+    assert error['after_process'][1] == error['after_recv'][1] == 'error'
+    assert not remoteobj.hooks.HOOKS['after_recv']
+
+
+def test_profile():
+    obj = Slow()
+    with remoteobj.util.listener(obj):
+        assert obj.remote.profile_start_() is True
+        with pytest.raises(RuntimeError):
+            obj.remote.profile_start_()  # already profiling
+        for _ in range(3):
+            obj.remote.work(0.01)
+        # everything but sleep takes ~0s of its own time, so a top-n cut would
+        # drop work() depending on timing noise. Print them all to check what was profiled.
+        text = obj.remote.profile_stop_(sort='tottime', limit=None)
+        assert 'work' in text and 'sleep' in text
+        assert 'Ordered by: internal time' in text
+        with pytest.raises(RuntimeError):
+            obj.remote.profile_stop_()  # not profiling
+
+        assert 'No requests' in obj.remote.profile_(0.01)
+        assert 'function calls' in obj.remote.profile_(0.05, whole=True)
+    assert obj.remote.profile_(0.01) is None  # not listening
+
+
+class Hog:
+    def __init__(self):
+        self.remote = remoteobj.Proxy(self)
+        self.data = []
+
+    def grow(self, n):
+        self.data.append(bytearray(n))
+
+    def start_tracing(self):
+        import tracemalloc
+        tracemalloc.start()
+
+    def is_tracing(self):
+        import tracemalloc
+        return tracemalloc.is_tracing()
+
+
+def test_heap_snapshot():
+    obj = Hog()
+    with remoteobj.util.listener(obj):
+        snap = obj.remote.heap_snapshot_()
+        assert snap['started']
+        obj.remote.grow(2_000_000)
+        snap = obj.remote.heap_snapshot_(top=3, diff=True)
+        assert not snap['started']
+        assert len(snap['top']) <= 3
+        biggest = snap['top'][0]
+        assert 'test_core.py' in biggest['where']
+        assert biggest['size_diff'] >= 2_000_000
+        assert snap['current'] >= 2_000_000
+
+        snap = obj.remote.heap_snapshot_(top=1, key='traceback')
+        assert 'size_diff' not in snap['top'][0] and snap['top'][0]['traceback']
+        assert obj.remote.heap_stop_()
+        assert obj.remote.heap_snapshot_()['started']
+        assert obj.remote.heap_stop_()
+    assert obj.remote.heap_snapshot_() is None  # not listening
+
+
+def test_heap_stop_user_tracing():
+    '''Test that heap_stop_ doesn't stop tracing that someone else started.'''
+    obj = Hog()
+    with remoteobj.util.listener(obj):
+        obj.remote.start_tracing()
+        assert not obj.remote.heap_snapshot_()['started']
+        assert not obj.remote.heap_stop_()
+        assert obj.remote.is_tracing()
+
+
+def test_record_replay(tmp_path):
+    path = str(tmp_path / 'requests.log.gz')
+    obj = ObjectB()
+    with remoteobj.util.listener(obj):
+        assert obj.remote.record_(path) is True
+        with pytest.raises(RuntimeError):
+            obj.remote.record_(path)  # already recording
+        for _ in range(3):
+            obj.remote.inc()
+            time.sleep(0.01)
+        obj.remote.data['b'] = b'x' * 1000
+        with pytest.raises(KeyError):
+            obj.remote.error()
+        assert obj.remote.x.get_(timeout=5) == 13
+        assert obj.remote.record_stop_() == 6
+
+    recs = list(remoteobj.record.read(path))
+    assert len(recs) == 6
+    assert [r.status for r in recs] == ['ok'] * 4 + ['error', 'ok']
+    assert recs[3].size > 1000
+    assert recs[0].timeout is None and 0 < recs[-1].timeout <= 5
+    assert recs[0].time < recs[1].time - 0.005
+
+    summary = remoteobj.record.summarize(path)
+    assert summary['count'] == 6
+    assert summary['shapes']['?.inc()'] == 3
+    assert summary['status'] == {'ok': 5, 'error': 1}
+
+    # replay against a fresh object
+    obj2 = ObjectB()
+    with remoteobj.util.listener(obj2):
+        res = remoteobj.record.replay(obj2.remote, path)
+        assert res['count'] == 6 and res['errors'] == 1 and res['timeouts'] == 0
+        assert res['duration'] >= recs[-1].time
+        assert obj2.remote.x.get_() == 13
+        assert obj2.remote.data['b'].get_() == b'x' * 1000
+        assert remoteobj.record.replay(obj2.remote, path, speed=None)['count'] == 6
+        assert obj2.remote.x.get_() == 16
+
+
+def test_record_without_stop(tmp_path):
+    '''Test that the log is closed when the listener stops and that a cut off
+    or empty log can still be read.'''
+    path = str(tmp_path / 'requests.log.gz')
+    obj = ObjectB()
+    with remoteobj.util.listener(obj):
+        obj.remote.record_(path)
+        for _ in range(50):
+            obj.remote.inc()
+    assert len(list(remoteobj.record.read(path))) == 50
+
+    with open(path, 'rb') as f:
+        data = remoteobj.record.gzip.decompress(f.read())
+    cut = str(tmp_path / 'cut.log')
+    with open(cut, 'wb') as f:
+        f.write(data[:-10])
+    assert len(list(remoteobj.record.read(cut))) == 49
+
+    empty = tmp_path / 'empty.log.gz'
+    empty.write_bytes(b'')
+    assert list(remoteobj.record.read(str(empty))) == []
+    assert remoteobj.record.summarize(str(empty))['count'] == 0
+
+
+class Owned:
+    def __init__(self, **kw):
+        self.remote = remoteobj.Proxy(self, **kw)
+
+    def who(self):
+        import threading
+        return threading.get_ident()
+
+    def work(self, t):
+        time.sleep(t)
+        return t
+
+    def error(self):
+        raise KeyError('error!')
+
+
+@pytest.mark.parametrize("thread_affine", [True, False])
+def test_thread_affine(thread_affine):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    obj = Owned(thread_affine=thread_affine)
+    with obj.remote.listen_(bg=True):
+        obj.remote.wait_until_listening(timeout=5)
+        owner = obj.remote._thread.ident
+        with ThreadPoolExecutor(4) as pool:
+            idents = set(pool.map(lambda _: obj.remote.who(), range(40)))
+        if not thread_affine:  # runs in the caller's thread
+            assert owner not in idents
+            return
+        assert idents == {owner}
+        assert obj.remote.who() == owner
+
+        with pytest.raises(KeyError):
+            obj.remote.error()
+        obj.remote.x = 5
+        assert obj.remote.x.get_() == 5
+        with pytest.raises(TimeoutError):
+            obj.remote.work(0.2, _timeout=0.05)
+        assert obj.remote.work(0.01) == 0.01
+    with pytest.raises(RuntimeError):
+        obj.remote.who()
+    assert obj.remote.who(_default=None) is None
+
+
+@pytest.mark.parametrize("fulfill_final", [True, False])
+def test_thread_affine_poll(fulfill_final):
+    '''The thread that polls runs the requests, and stopping drains them.'''
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    obj = Owned(thread_affine=True, fulfill_final=fulfill_final, default='cancelled')
+    with ThreadPoolExecutor(2) as pool:
+        with obj.remote:
+            fut = pool.submit(obj.remote.who)
+            while obj.remote.pending_requests() < 1:
+                time.sleep(1e-3)
+            assert not fut.done()
+            obj.remote.poll()
+            assert fut.result(timeout=1) == threading.get_ident()
+
+            fut = pool.submit(obj.remote.who)
+            while obj.remote.pending_requests() < 1:
+                time.sleep(1e-3)
+        # stopped without polling
+        assert fut.result(timeout=1) == (threading.get_ident() if fulfill_final else 'cancelled')
@@ -1,3 +1,5 @@
+import os
+import time
 import remoteobj
 import pytest
 
@@ -59,3 +61,176 @@ def test_local_exceptions():
     for name, excs in ALL_RAISED_.items():
         assert compare_excs(catch.group(name), excs)
     assert len(catch.all()) == N_RAISED_
+
+
+def _raise_in(catch, exc):
+    with catch(raises=False):
+        raise exc
+
+
+def test_shared_queue_routing():
+    '''Multiple Except objects share a queue, but keep their own exceptions.'''
+    catch1, catch2 = remoteobj.Except(), remoteobj.Except()
+    with remoteobj.util.process(_raise_in, catch1, KeyError('1')):
+        pass
+    with remoteobj.util.process(_raise_in, catch2, ValueError('2')):
+        pass
+    # pulling one routes messages for the other
+    assert compare_excs(catch2.all(), [ValueError('2')]) and len(catch2.all()) == 1
+    assert compare_excs(catch1.all(), [KeyError('1')]) and len(catch1.all()) == 1
+
+
+def test_registry_cleanup():
+    import gc
+    registry = remoteobj.Except._Except__excs
+    gc.collect()
+    n = len(registry)
+    catches = [remoteobj.Except() for _ in range(100)]
+    assert len(registry) == n + 100
+    del catches
+    gc.collect()
+    assert len(registry) == n
+
+
+def _raise_repeatedly(catch, n=10):
+    for i in range(n):
+        with catch('loop', raises=False):
+            raise KeyError('same')
+    with catch('loop', raises=False):
+        raise KeyError('different')
+
+
+@pytest.mark.parametrize("remote", [False, True])
+def test_dedupe(remote):
+    catch = remoteobj.Except(dedupe=True) if remote else remoteobj.LocalExcept(dedupe=True)
+    if remote:
+        with remoteobj.util.process(_raise_repeatedly, catch):
+            pass
+    else:
+        _raise_repeatedly(catch)
+    excs = catch.group('loop')
+    assert compare_excs(excs, [KeyError('same'), KeyError('different')]) and len(excs) == 2
+    assert excs[0].__remoteobj_count__ == 10 and excs[1].__remoteobj_count__ == 1
+    assert excs[0].__remoteobj_first__ <= excs[0].__remoteobj_last__
+    assert catch.get('loop') is excs[1]
+
+
+def _nested_raise():
+    try:
+        raise ValueError('inner')
+    except ValueError as e:
+        raise KeyError('outer') from e
+
+
+def test_remote_traceback_summary():
+    with remoteobj.util.process(_nested_raise, raises_=False) as p:
+        pass
+    exc = p.exc.get()
+    assert isinstance(exc, KeyError)
+    tb = str(exc.__cause__)
+    assert '_nested_raise' in tb and 'ValueError: inner' in tb and 'direct cause' in tb
+
+
+def _raise_many(catch, n=50):
+    for i in range(n):
+        with catch('noisy', raises=False):
+            raise (KeyError if i % 2 else ValueError)(i)
+
+
+@pytest.mark.parametrize("remote", [False, True])
+def test_max_per_group(remote):
+    catch = remoteobj.Except(max_per_group=10) if remote else remoteobj.LocalExcept(max_per_group=10)
+    if remote:
+        with remoteobj.util.process(_raise_many, catch):
+            pass
+    else:
+        _raise_many(catch)
+    excs = catch.group('noisy')
+    assert len(excs) == 10
+    assert [int(str(e)) for e in excs] == list(range(40, 50))
+    assert [int(str(e)) for e in excs[-2:]] == [48, 49]  # a list, not the deque it's stored in
+    stats = catch.stats()['noisy']
+    assert stats['count'] == 50 and stats['stored'] == 10 and stats['dropped'] == 40
+    assert stats['types'] == {'KeyError': 25, 'ValueError': 25}
+    assert stats['first'] <= stats['last']
+    assert '[50 raised]' in str(catch)
+
+
+def _raise_later(catch, delay=0.2):
+    import time
+    with catch('init', raises=False):
+        raise ValueError('init')
+    time.sleep(delay)
+    with catch('work', raises=False):
+        raise KeyError('work')
+    time.sleep(delay)
+
+
+def test_on_error():
+    '''Test that callbacks are called as exceptions arrive, without pulling.'''
+    import time
+    import threading
+    catch = remoteobj.Except()
+    seen, seen_work = [], []
+    event = threading.Event()
+    catch.on_error(lambda e, name: seen.append((name, e)))
+    catch.on_error(lambda e, name: (seen_work.append(e), event.set()), group='work')
+    p = remoteobj.util.process(_raise_later, catch).start()
+    t0 = time.time()
+    assert event.wait(5)
+    assert time.time() - t0 < 1
+    assert [name for name, _ in seen] == ['init', 'work']
+    assert compare_excs(seen_work, [KeyError('work')]) and len(seen_work) == 1
+    p.join()
+    assert len(seen) == 2  # not called again on pull
+
+
+def _raise_one(catch):
+    with catch('x', raises=False):
+        raise ValueError('dedicated')
+
+
+def test_shared_queue():
+    catch = remoteobj.Except(shared_queue=True)
+    assert catch._shared and catch._q is remoteobj.Except._shared_queue()
+    with remoteobj.util.process(_raise_one, catch):
+        pass
+    assert compare_excs(catch.group('x'), [ValueError('dedicated')])
+
+
+def _stream():
+    i = 0
+    while True:
+        yield i
+        i += 1
+
+
+def test_killed_sender():
+    '''A process killed while it's sending doesn't block the ones after it.'''
+    import signal
+    for _ in range(5):
+        # send every value on its own so it's always writing
+        p = remoteobj.util.process(_stream, exc_=remoteobj.Except(chunk_size=1)).start()
+        time.sleep(0.05)
+        os.kill(p.pid, signal.SIGKILL)
+        p.join(raises=False)
+        catch = remoteobj.Except()
+        remoteobj.util.process(_raise_one, catch).start().join(timeout=5)
+        assert compare_excs(catch.group('x'), [ValueError('dedicated')])
+
+
+def _count(n):
+    yield from range(n)
+
+
+@pytest.mark.parametrize("shared_queue", [False, True])
+def test_pull_order_with_collector(shared_queue):
+    '''The collector thread and this one both pull, but the results still
+    arrive in order.'''
+    catch = remoteobj.Except(chunk_size=1, shared_queue=shared_queue)
+    catch.on_error(lambda e, name: None)
+    p = remoteobj.util.process(_count, 3000, exc_=catch).start()
+    while p.result is None:  # the first value hasn't arrived
+        time.sleep(1e-3)
+    assert list(p.result) == list(range(3000))
+    p.join()
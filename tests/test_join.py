@@ -0,0 +1,112 @@
+import time
+import pytest
+import remoteobj
+
+
+def _sleep(t):
+    time.sleep(t)
+    return t
+
+def _fail(t):
+    time.sleep(t)
+    raise KeyError(t)
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_as_completed(threaded):
+    jobs = [remoteobj.util.job(_sleep, t, threaded_=threaded).start() for t in [0.3, 0.1, 0.2]]
+    done = [j.result for j in remoteobj.util.as_completed(jobs)]
+    assert done == [0.1, 0.2, 0.3]
+
+
+def test_as_completed_mixed():
+    with remoteobj.util.pool(1) as p:
+        jobs = [
+            remoteobj.util.process(_sleep, 0.3).start(),
+            remoteobj.util.thread(_sleep, 0.1).start(),
+            p.submit(_sleep, 0.2),
+        ]
+        done = [j.result for j in remoteobj.util.as_completed(jobs)]
+    assert done == [0.1, 0.2, 0.3]
+
+
+def test_as_completed_timeout():
+    jobs = [remoteobj.util.process(_sleep, 1).start()]
+    with pytest.raises(TimeoutError):
+        list(remoteobj.util.as_completed(jobs, timeout=0.2))
+    remoteobj.util.join_all(jobs)
+
+
+def test_join_all():
+    jobs = [remoteobj.util.process(_sleep, 0.1 * i).start() for i in range(5)]
+    assert remoteobj.util.join_all(jobs) == jobs
+    assert [j.result for j in jobs] == [0.1 * i for i in range(5)]
+
+
+def test_join_all_fail_fast():
+    slow = remoteobj.util.process(_sleep, 5).start()
+    jobs = [slow, remoteobj.util.process(_fail, 0.1).start()]
+    t0 = time.time()
+    with pytest.raises(KeyError):
+        remoteobj.util.join_all(jobs)
+    assert time.time() - t0 < 2
+    assert not slow.is_alive()  # it got cancelled
+
+
+def _stream():
+    i = 0
+    while not remoteobj.util.cancelled():
+        yield i
+        i += 1
+
+
+def test_join_all_fail_fast_streaming():
+    '''Test that terminating a job while it's streaming results doesn't
+    block the jobs after it.'''
+    for _ in range(6):
+        # send every value on its own so it's always writing
+        stream = remoteobj.util.process(_stream, exc_=remoteobj.Except(chunk_size=1)).start()
+        jobs = [stream, remoteobj.util.process(_fail, 0.05).start()]
+        with pytest.raises(KeyError):
+            remoteobj.util.join_all(jobs, timeout=10)
+        assert not stream.is_alive() and stream.exitcode < 0  # terminated
+        assert list(stream.result)[:3] == [0, 1, 2]
+    p = remoteobj.util.process(_sleep, 0.01).start()
+    p.join(timeout=5)
+    assert p.result == 0.01
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_cancel(threaded):
+    # threads can only be asked to stop
+    job = remoteobj.util.job(_stream, threaded_=threaded).start()
+    time.sleep(0.1)
+    assert job.cancel() == (not threaded)
+    job.join(timeout=5)
+    assert job.done()
+    assert len(list(job.result)) > 3
+
+
+def test_cancel_without_terminate():
+    p = remoteobj.util.process(_stream).start()
+    time.sleep(0.1)
+    assert not p.cancel(terminate=False)
+    p.join(timeout=5)  # it stops on its own
+    assert p.exitcode == 0 and len(list(p.result)) > 3
+
+
+def test_join_all_no_fail_fast():
+    jobs = [remoteobj.util.process(_sleep, 0.3).start(), remoteobj.util.process(_fail, 0.1).start()]
+    with pytest.raises(KeyError):
+        remoteobj.util.join_all(jobs, fail_fast=False)
+    assert jobs[0].result == 0.3
+
+
+def test_thread_sentinel():
+    import multiprocessing as mp
+    t = remoteobj.util.thread(_sleep, 0.2).start()
+    assert not t.done()
+    assert not mp.connection.wait([t.sentinel], timeout=0.05)
+    assert mp.connection.wait([t.sentinel], timeout=2)
+    t.join()
+    assert t.done() and t.result == 0.2
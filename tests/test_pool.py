@@ -0,0 +1,159 @@
+import os
+import time
+import pytest
+import remoteobj
+
+
+def _add(x, y):
+    return x + y
+
+def _add1(x):
+    return x + 1
+
+def _pid():
+    return os.getpid()
+
+def _error(x):
+    raise KeyError(x)
+
+def _yield(n):
+    yield from range(n)
+
+def _groups(exc):
+    with exc('init'):
+        raise ValueError('init')
+
+def _die():
+    os._exit(3)
+
+def _sleep(t):
+    time.sleep(t)
+    return t
+
+
+def test_pool_submit():
+    with remoteobj.util.pool(2) as p:
+        jobs = [p.submit(_add, i, 1) for i in range(10)]
+        assert [j.join().result for j in jobs] == list(range(1, 11))
+
+
+def test_pool_reuses_workers():
+    with remoteobj.util.pool(2) as p:
+        pids = {p.submit(_pid).join().result for _ in range(10)}
+    assert len(pids) <= 2 and os.getpid() not in pids
+
+
+def test_pool_error():
+    with remoteobj.util.pool(2) as p:
+        job = p.submit(_error, 'x')
+        with pytest.raises(KeyError):
+            job.join()
+        # the worker is still usable
+        assert p.submit(_add, 1, 2).join().result == 3
+
+
+def test_pool_yield():
+    with remoteobj.util.pool(2) as p:
+        job = p.submit(_yield, 1000)
+        assert list(job.join().result) == list(range(1000))
+
+
+def test_pool_groups():
+    exc = remoteobj.Except()
+    with remoteobj.util.pool(1) as p:
+        p.submit(_groups, exc, exc_=exc, raises_=False).join()
+    assert isinstance(exc.get('init'), ValueError)
+
+
+def test_pool_replaces_dead_workers():
+    with remoteobj.util.pool(2) as p:
+        job = p.submit(_die)
+        with pytest.raises(RuntimeError):
+            job.join(timeout=5)
+        assert job.done()
+        # still have two working workers
+        jobs = [p.submit(_add, i, 1) for i in range(4)]
+        assert [j.join(timeout=5).result for j in jobs] == [1, 2, 3, 4]
+        assert len(p._workers) == 2 and all(w.proc.is_alive() for w in p._workers)
+
+
+def test_pool_cancel():
+    with remoteobj.util.pool(1) as p:
+        first = p.submit(_sleep, 0.3)
+        time.sleep(0.1)
+        second = p.submit(_sleep, 0.3)
+        assert second.cancel()
+        assert not first.cancel()  # already running
+        assert first.join().result == 0.3
+        assert second.done() and second.result is None
+
+
+def _count(n):
+    for i in range(n):
+        if remoteobj.util.cancelled():
+            return i
+        time.sleep(0.01)
+    return n
+
+
+def test_pool_cancel_running():
+    with remoteobj.util.pool(1) as p:
+        first = p.submit(_count, 1000)
+        time.sleep(0.1)
+        assert not first.cancel()  # it's running, so it's only asked to stop
+        assert first.join(timeout=5).result < 100
+        assert p.submit(_count, 3).join(timeout=5).result == 3  # the next job isn't cancelled
+
+
+def test_pool_closed():
+    p = remoteobj.util.pool(1)
+    p.close()
+    with pytest.raises(RuntimeError):
+        p.submit(_add, 1, 2)
+    p.join(timeout=5)
+    assert not p._thread.is_alive()
+
+
+def _square(x):
+    if x == 13:
+        raise ValueError('unlucky')
+    return x * x
+
+def _sleep_rev(x):
+    time.sleep(0.05 * (3 - x))
+    return x
+
+
+@pytest.mark.parametrize("chunksize", [1, 4])
+def test_pmap_ordered(chunksize):
+    assert list(remoteobj.util.pmap(_add1, range(50), workers=3, chunksize=chunksize)) == list(range(1, 51))
+
+
+def test_pmap_unordered():
+    xs = list(remoteobj.util.pmap(_sleep_rev, range(4), workers=4, ordered=False))
+    assert sorted(xs) == [0, 1, 2, 3]
+    assert xs[0] == 3  # the fastest one comes back first
+
+
+@pytest.mark.parametrize("chunksize", [1, 5])
+def test_pmap_error_index(chunksize):
+    results = []
+    with pytest.raises(ValueError) as e:
+        for y in remoteobj.util.pmap(_square, range(20), workers=2, chunksize=chunksize):
+            results.append(y)
+    assert results == [x * x for x in range(13)]
+    assert e.value.__remoteobj_index__ == 13
+    assert '_square' in str(e.value.__cause__)
+
+
+def test_pmap_lazy():
+    import itertools
+    it = remoteobj.util.pmap(_add1, itertools.count(), workers=2)
+    assert [next(it) for _ in range(10)] == list(range(1, 11))
+    it.close()
+
+
+def test_pmap_pool():
+    with remoteobj.util.pool(2) as p:
+        assert list(remoteobj.util.pmap(_add1, range(10), pool_=p)) == list(range(1, 11))
+        assert p.submit(_add, 1, 2).join().result == 3
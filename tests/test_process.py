@@ -180,3 +180,83 @@ def test_process_name(threaded):
 
         with remoteobj.util.job(some_function, threaded_=threaded) as p:
             assert p.name == '{}-{}'.format(name, i+3)
+
+
+def _yield_many(n, count=None):
+    for i in range(n):
+        if count is not None:
+            count.value = i + 1
+        yield i
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_process_yield_chunks(threaded):
+    '''Test that yielded values are sent in chunks and arrive in order.'''
+    exc = (remoteobj.LocalExcept if threaded else remoteobj.Except)(chunk_size=100)
+    with remoteobj.util.job(_yield_many, 10005, exc_=exc, threaded_=threaded) as p:
+        pass
+    assert list(p.result) == list(range(10005))
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_process_yield_backpressure(threaded):
+    '''Test that a full result buffer makes the generator wait.'''
+    import multiprocessing as mp
+    count = mp.Value('i', 0)
+    exc = (remoteobj.LocalExcept if threaded else remoteobj.Except)(chunk_size=10, max_buffer=2)
+    with remoteobj.util.job(_yield_many, 1000, count, exc_=exc, threaded_=threaded) as p:
+        time.sleep(0.3)
+        # 2 chunks in the buffer + the one that's waiting
+        assert count.value <= 31
+        assert list(p.result) == list(range(1000))
+    assert count.value == 1000
+
+
+def _yield_slow(delay):
+    yield 'first'
+    time.sleep(delay)
+    yield 'second'
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_process_yield_max_latency(threaded):
+    '''Test that a yielded value is sent within max_latency even if the
+    generator takes a while to yield the next one.'''
+    exc = (remoteobj.LocalExcept if threaded else remoteobj.Except)(max_latency=0.05)
+    with remoteobj.util.job(_yield_slow, 1, exc_=exc, threaded_=threaded) as p:
+        t0 = time.time()
+        while p.result is None and time.time() - t0 < 1:
+            time.sleep(0.01)
+        results = p.result
+        assert next(results) == 'first'
+        assert time.time() - t0 < 0.5
+        assert list(results) == ['second']
+
+
+def test_process_join_latency():
+    '''Test that join returns as soon as the process exits, without polling.'''
+    p = remoteobj.util.process(_return, 5, 6).start()
+    time.sleep(0.3)  # it's done by now
+    t0 = time.time()
+    p.join()
+    assert time.time() - t0 < 0.05
+    assert p.result == 11
+
+
+def test_process_join_timeout():
+    p = remoteobj.util.process(delay_return, 1).start()
+    t0 = time.time()
+    p.join(timeout=0.2)
+    assert 0.15 < time.time() - t0 < 0.5
+    assert p.is_alive()
+    p.join()
+    assert p.result == 10
+
+
+def test_process_join_timeout_exitcode():
+    '''Test that joining with a timeout reaps the process if it exits in time.'''
+    p = remoteobj.util.process(delay_return, 0.1).start()
+    p.join(timeout=3)
+    assert not p.is_alive()
+    assert p.exitcode == 0
+    assert p.result == 10